@@ -1,15 +1,51 @@
+import numpy as np
 import tensorflow as tf
 from tensorflow.contrib.keras import backend as K
 
 from app.app.util import plot_loss_curves, print_stats, embedd_and_plot
 from app.ds.data_pipeline import DataPipeline
+from app.ds.data_pipeline_minibatch import DataPipelineMiniBatch
+from app.model.inference import LayerwiseInference
 from app.model.model_select import select_model
 from app.model.params import SparseModelParams
 from app.utils.constant import *
 
 
+def _run_minibatches(sess, model, datapipeline, mode):
+    '''
+    Method to run the model over all the mini-batches of `mode`, training it if `mode` is TRAIN.
+    Returns the loss and the accuracy averaged over the nodes and the summary of the last mini-batch, which is None if
+    no mini-batch with nodes in the loss has run.
+    With the historical embeddings, the hidden activations of every mini-batch are written back to the datapipeline.
+    '''
+    fetches = [model.loss, model.accuracy, model.summary_op]
+    if (mode == TRAIN):
+        fetches.append(model.optimizer_op)
+    history_fetches = []
+    if (datapipeline.history is not None):
+        history_fetches = model.activations[1:-1]
+    totals = np.zeros(2)
+    node_count = 0
+    summary = None
+    for feed_dict, batch_size, nodes in datapipeline.get_batches(mode=mode):
+        if (batch_size == 0):
+            # Mini-batches without any node in the loss only refresh the historical embeddings
+            datapipeline.update_history(nodes, sess.run(history_fetches, feed_dict=feed_dict))
+            continue
+        values = sess.run(fetches + history_fetches, feed_dict=feed_dict)
+        loss, accuracy, summary = values[:3]
+        if (history_fetches):
+            datapipeline.update_history(nodes, values[len(fetches):])
+        totals += np.asarray([loss, accuracy]) * batch_size
+        node_count += batch_size
+    loss, accuracy = totals / max(node_count, 1)
+    return loss, accuracy, summary
+
+
 def run(model_params, data_dir, dataset_name, experiment=None):
-    datapipeline = DataPipeline(model_params=model_params,
+    minibatch = model_params.batch_size > 0
+    datapipeline_class = DataPipelineMiniBatch if minibatch else DataPipeline
+    datapipeline = datapipeline_class(model_params=model_params,
                                 data_dir=data_dir,
                                 dataset_name=dataset_name)
 
@@ -22,7 +58,6 @@ def run(model_params, data_dir, dataset_name, experiment=None):
     feed_dict_test = datapipeline.get_feed_dict(mode=TEST)
 
     sparse_model_params = SparseModelParams(
-        num_elements=datapipeline.num_elements,
         feature_size=datapipeline.feature_size
     )
 
@@ -32,6 +67,7 @@ def run(model_params, data_dir, dataset_name, experiment=None):
 
     sess = tf.Session()
     K.set_session(sess)
+    datapipeline.initialize(sess)
 
     train_loss_runs = []
     validation_loss_runs = []
@@ -47,6 +83,10 @@ def run(model_params, data_dir, dataset_name, experiment=None):
             placeholder_dict=placeholder_dict
         )
 
+        if (minibatch):
+            # Every model starts with its own historical embeddings, one per hidden layer
+            datapipeline.init_history([layer.output_dim for layer in model.layers[:-1]])
+
         if (model_params.tensorboard_logs_dir):
             train_writer = tf.summary.FileWriter(
                 model_params.tensorboard_logs_dir + model_params.model_name + "/" + TRAIN,
@@ -60,32 +100,67 @@ def run(model_params, data_dir, dataset_name, experiment=None):
         test_accuracy_list = []
 
         for epoch in range(model_params.epochs):
-            loss, accuracy, opt, summary = sess.run([model.loss, model.accuracy, model.optimizer_op, model.summary_op],
-                                                    feed_dict=feed_dict_train)
+            if (minibatch):
+                loss, accuracy, summary = _run_minibatches(sess, model, datapipeline, mode=TRAIN)
+                loss_val, accuracy_val, summary_val = _run_minibatches(sess, model, datapipeline, mode=VALIDATION)
+            else:
+                loss, accuracy, opt, summary = sess.run(
+                    [model.loss, model.accuracy, model.optimizer_op, model.summary_op],
+                    feed_dict=feed_dict_train)
 
-            loss_val, accuracy_val, summary_val = sess.run([model.loss, model.accuracy, model.summary_op],
-                                                           feed_dict=feed_dict_val)
+                loss_val, accuracy_val, summary_val = sess.run([model.loss, model.accuracy, model.summary_op],
+                                                               feed_dict=feed_dict_val)
 
             if (model_params.tensorboard_logs_dir):
-                train_writer.add_summary(summary, epoch)
-                val_writer.add_summary(summary_val, epoch)
+                # There is no summary for an epoch in which no mini-batch has run
+                if (summary is not None):
+                    train_writer.add_summary(summary, epoch)
+                if (summary_val is not None):
+                    val_writer.add_summary(summary_val, epoch)
 
             train_loss_list.append(loss)
             validation_loss_list.append(loss_val)
 
-            accuracy_test = sess.run([model.accuracy], feed_dict=feed_dict_test)
+            if (minibatch):
+                accuracy_test = [_run_minibatches(sess, model, datapipeline, mode=TEST)[1]]
+            else:
+                accuracy_test = sess.run([model.accuracy], feed_dict=feed_dict_test)
             test_accuracy_list.append(accuracy_test)
 
         train_loss_runs.append(train_loss_list)
         validation_loss_runs.append(validation_loss_list)
         test_accuracy_runs.append(test_accuracy_list)
 
+    if (minibatch):
+        datapipeline.release_history()
+
     plot_loss_curves(train_loss_runs, validation_loss_runs, dataset_name=dataset_name,
                      model_params=model_params)
     print_stats(train_loss_runs, validation_loss_runs, test_metrics=[test_accuracy_runs],
                 test_metrics_labels=[ACCURACY])
 
-    activations, khot_labels, mask = sess.run([model.activations, model.labels, model.mask], feed_dict=feed_dict_train)
-    embedd_and_plot(node_representation=activations[-2], labels = khot_labels, mask=mask)
+    if (model_params.inference_chunk_size > 0):
+        mmap_dir = model_params.cache_dir if model_params.mmap_inference else None
+        supports = None
+        if (model_params.model_name not in [FF, SGC]):
+            supports = datapipeline.graph.compute_supports(model_params=model_params)
+        inference = LayerwiseInference(model=model,
+                                       chunk_size=model_params.inference_chunk_size,
+                                       supports=supports,
+                                       mmap_dir=mmap_dir)
+        activations = inference.run(sess, features=datapipeline.features)
+        if (minibatch):
+            mask = datapipeline.split_index[TRAIN]
+        else:
+            mask = sess.run(model.mask, feed_dict=feed_dict_train)
+        embedd_and_plot(node_representation=activations[-2], labels=datapipeline.graph.labels, mask=mask)
+        inference.release()
+
+    elif (not minibatch):
+        # The activations of a mini-batch only cover the sampled nodes so the embeddings are plotted for the full
+        # batch mode only
+        activations, khot_labels, mask = sess.run([model.activations, model.labels, model.mask],
+                                                  feed_dict=feed_dict_train)
+        embedd_and_plot(node_representation=activations[-2], labels = khot_labels, mask=mask)
 
 
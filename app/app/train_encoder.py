@@ -8,20 +8,33 @@ from app.utils.metrics import compute_auc_score, compute_average_precision_recal
 from app.app.util import plot_loss_curves, print_stats
 
 
-def run(model_params, data_dir, dataset_name, experiment=None):
-    datapipeline = DataPipelineAE(model_params=model_params,
-                                data_dir=data_dir,
-                                dataset_name=dataset_name)
+def _read_data(model_params, data_dir, dataset_name, split_seed=None):
+    '''Method to return the datapipeline for the edge split corresponding to `split_seed`'''
+    return DataPipelineAE(model_params=model_params,
+                          data_dir=data_dir,
+                          dataset_name=dataset_name,
+                          split_seed=split_seed)
+
+
+def _get_data(datapipeline):
+    '''Method to return the feed dicts, model params and placeholders for the current split of the datapipeline'''
+    feed_dicts = [datapipeline.get_feed_dict(mode=mode) for mode in [TRAIN, VALIDATION, TEST]]
 
-    feed_dict_train = datapipeline.get_feed_dict(mode=TRAIN)
+    return feed_dicts, datapipeline.get_sparse_model_params(), \
+           datapipeline.get_autoencoder_model_params(), datapipeline.get_placeholder_dict()
 
-    feed_dict_val = datapipeline.get_feed_dict(mode=VALIDATION)
 
-    feed_dict_test = datapipeline.get_feed_dict(mode=TEST)
+def _get_split_seed(model_params, num_exp):
+    '''Method to return the seed for the edge split used in the run `num_exp`'''
+    if (model_params.split_seeds):
+        return model_params.split_seeds[num_exp % len(model_params.split_seeds)]
+    return None
 
-    sparse_model_params = datapipeline.get_sparse_model_params()
-    autoencoder_model_params = datapipeline.get_autoencoder_model_params()
-    placeholder_dict = datapipeline.get_placeholder_dict()
+
+def run(model_params, data_dir, dataset_name, experiment=None):
+    datapipeline = _read_data(model_params, data_dir, dataset_name, split_seed=_get_split_seed(model_params, 0))
+    (feed_dict_train, feed_dict_val, feed_dict_test), sparse_model_params, \
+    autoencoder_model_params, placeholder_dict = _get_data(datapipeline)
 
     if(experiment):
         experiment.add_config(sparse_model_params.get_variables())
@@ -29,6 +42,7 @@ def run(model_params, data_dir, dataset_name, experiment=None):
 
     sess = tf.Session()
     K.set_session(sess)
+    datapipeline.initialize(sess)
 
     train_loss_runs = []
     validation_loss_runs = []
@@ -37,6 +51,13 @@ def run(model_params, data_dir, dataset_name, experiment=None):
 
     for num_exp in range(model_params.num_exp):
 
+        if (num_exp > 0 and len(model_params.split_seeds) > 1):
+            # Every run gets its own edge split while the graph is read only once
+            datapipeline.set_split_seed(_get_split_seed(model_params, num_exp))
+            (feed_dict_train, feed_dict_val, feed_dict_test), sparse_model_params, \
+            autoencoder_model_params, placeholder_dict = _get_data(datapipeline)
+            datapipeline.initialize(sess)
+
         model = select_model(model_name=model_params.model_name)(
             model_params=model_params,
             sparse_model_params=sparse_model_params,
@@ -72,24 +93,22 @@ def run(model_params, data_dir, dataset_name, experiment=None):
                 train_writer.add_summary(summary, epoch)
                 val_writer.add_summary(summary_val, epoch)
 
-            embedding, predictions_test, labels_test, mask_test, loss_test, accuracy_test, summary_test = sess.run(
+            # Only the scores of the test pairs are fetched instead of the dense N X N output
+            embedding, predictions_test, labels_test, loss_test, accuracy_test, summary_test = sess.run(
                 [model.embeddings,
-                 model.logits,
-                 model.labels,
-                 model.mask,
+                 model.pair_scores,
+                 model.pair_labels,
                  model.loss,
                  model.accuracy,
                  model.summary_op],
                 feed_dict=feed_dict_test)
 
             auc_score = compute_auc_score(labels=labels_test,
-                                                        predictions=predictions_test,
-                                                        mask=mask_test)
+                                                        predictions=predictions_test)
             test_aucscore_list.append(auc_score)
 
             apr = compute_average_precision_recall(labels=labels_test,
-                                                        predictions=predictions_test,
-                                                        mask=mask_test)
+                                                        predictions=predictions_test)
             test_apr_list.append(apr)
 
             train_loss_list.append(loss)
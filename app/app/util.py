@@ -84,13 +84,15 @@ def print_stats(train_loss_runs, validation_loss_runs, test_metrics, test_metric
         ))
 
 def embedd_and_plot(node_representation, labels, mask):
-    '''Method to compute and plot the t_sne embeddings for given node representation'''
-    node_embedding = compute_embeddings(node_representation)
+    '''
+    Method to compute and plot the t_sne embeddings for given node representation.
+    `mask` is the vector of indices of the nodes to plot.
+    '''
+    node_embedding = compute_embeddings(node_representation[mask])
     if(len(labels.shape)==2):
     #     k-hot label provided
         labels = np.argmax(labels, axis=1)
-    labels=labels[mask>0]
-    node_embedding = node_embedding[mask>0]
+    labels=labels[mask]
     plt.scatter(node_embedding[:,0], node_embedding[:,1], c = labels)
     # plt.show()
 
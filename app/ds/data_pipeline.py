@@ -1,10 +1,13 @@
+import threading
+
 import numpy as np
+from scipy import sparse as sp
 import tensorflow as tf
 
 from app.ds.graph.preprocessed_graph import Graph
 from app.model.params import SparseModelParams
 from app.utils.constant import TRAIN, LABELS, FEATURES, SUPPORTS, MASK, VALIDATION, TEST, DROPOUT, GCN, \
-    FF, GCN_POLY
+    FF, GCN_POLY, MODE, RESIDENT_DATA, SGC
 
 
 class DataPipeline():
@@ -12,25 +15,45 @@ class DataPipeline():
 
     def __init__(self, model_params, data_dir, dataset_name):
         self.graph = None
+        self.features = None
         self._populate_graph(model_params, data_dir, dataset_name)
         self.data_dir = data_dir
         self.dataset_name = dataset_name
         self.model_params = model_params
-        self.num_elements = -1
-        self.feature_size = self.graph.features.shape[1]
+        self.feature_size = self.features.shape[1]
         self.node_size = self.graph.features.shape[0]
         self.label_size = self.graph.labels.shape[1]
-        self.support_size = self.model_params.support_size
+        self.support_size = self.model_params.num_supports
         self.supports = []
         self.placeholder_dict = {}
         self.train_feed_dict = {}
         self.validation_feed_dict = {}
         self.test_feed_dict = {}
+        # Values for initialising the resident graph data. Used only when model_params.resident_graph is set.
+        self.resident_feed_dict = {}
+        self.resident_variables = []
+        # Placeholders for initialising the resident variables and, for every resident value, the placeholder and the
+        # mode of the feed dict it is read from along with its initial value placeholders
+        self.resident_placeholders = []
+        self.resident_sources = []
+        self.resident_init_op = None
+        self.input_placeholder_dict = {}
+        # Converted values of the matrices which the pipeline does not change, by name. The lock guards them against
+        # the threads which prepare the feed dicts.
+        self.sparse_tensors = {}
+        self.sparse_tensors_lock = threading.Lock()
         self._populate_feed_dicts()
+        if (self.model_params.resident_graph):
+            self._make_graph_resident()
 
     def _populate_graph(self, model_params, data_dir, dataset_name):
-        self.graph = Graph(model_name=model_params.model_name, sparse_features=model_params.sparse_features)
+        self.graph = Graph(model_name=model_params.model_name, sparse_features=model_params.sparse_features,
+                           cache_dir=model_params.cache_dir, mmap_features=model_params.mmap_features)
         self.graph.read_data(data_dir=data_dir, dataset_name=dataset_name)
+        # Features fed to the model. The sgc model only sees the features propagated over the graph.
+        self.features = self.graph.features
+        if (model_params.model_name == SGC):
+            self.features = self.graph.compute_propagated_features(model_params=model_params)
 
     def _set_placeholder_dict(self):
         '''
@@ -41,7 +64,8 @@ class DataPipeline():
         features_placeholder = tf.placeholder(tf.float32, shape=(None, self.feature_size), name=FEATURES)
         if (self.model_params.sparse_features):
             features_placeholder = tf.sparse_placeholder(tf.float32, shape=(None, self.feature_size), name=FEATURES)
-        mask_placeholder = tf.placeholder(tf.float32, name=MASK)
+        # Indices of the nodes in the split
+        mask_placeholder = tf.placeholder(tf.int32, shape=(None,), name=MASK)
 
         # For disabling dropout during testing - based on https://stackoverflow.com/questions/44971349/how-to-turn-off-dropout-for-testing-in-tensorflow
         dropout_placeholder = tf.placeholder_with_default(0.0, shape=(), name=DROPOUT)
@@ -61,14 +85,12 @@ class DataPipeline():
 
     def _prepare_feed_dict(self, labels, features, mask_indices, dropout):
 
-        y = np.zeros(labels.shape)
-        y[mask_indices,:] = labels[mask_indices,:]
-
+        # The labels are shared across the splits and the models only look at the rows in mask_indices
         placeholder_dict = self.placeholder_dict
         feed_dict = {
-            placeholder_dict[LABELS]: y,
+            placeholder_dict[LABELS]: labels,
             placeholder_dict[FEATURES]: features,
-            placeholder_dict[MASK]: map_indices_to_mask(indices=mask_indices, mask_size=self.node_size),
+            placeholder_dict[MASK]: np.asarray(mask_indices, dtype=np.int32),
             placeholder_dict[DROPOUT]: dropout
         }
         for i in range(self.support_size):
@@ -80,13 +102,10 @@ class DataPipeline():
 
         self._set_placeholder_dict()
 
-        features = self.graph.features
+        features = self.features
         labels = self.graph.labels
         supports = self.graph.compute_supports(model_params=self.model_params)
 
-        if (self.model_params.sparse_features):
-            self.num_elements = features.nnz
-
         if(self.graph.preprocessed):
             train_index, val_index, test_index = self.graph.read_data(dataset_name=self.dataset_name, data_dir=self.data_dir)
 
@@ -98,7 +117,10 @@ class DataPipeline():
                 labels = labels[shuffle]
             train_index, val_index, test_index = self.graph.get_node_mask(dataset_splits=dataset_splits)
 
-        features = convert_sparse_matrix_to_sparse_tensor(features)
+        if (self.model_params.sparse_features):
+            features = convert_sparse_matrix_to_sparse_tensor(features)
+        elif (sp.issparse(features)):
+            features = features.toarray()
 
         self.supports = list(
             map(
@@ -111,7 +133,7 @@ class DataPipeline():
 
     def _prepare_data(self, dataset_splits, shuffle_data=False):
 
-        if(self.model_params.model_name in set([GCN, GCN_POLY, FF])):
+        if(self.model_params.model_name in set([GCN, GCN_POLY, FF, SGC])):
             return self._prepare_data_node_classifier(dataset_splits=dataset_splits,
                                                       shuffle_data=shuffle_data)
         else:
@@ -138,6 +160,125 @@ class DataPipeline():
                                                        mask_indices=test_index,
                                                        dropout=0)
 
+    def _get_sparse_tensor(self, name, X):
+        '''
+        Method to return the SparseTensorValue for the matrix `X`, converted only the first time it is asked for by
+        `name`. Only meant for the matrices which are not changed after they are read, like the features of the graph.
+        '''
+        with self.sparse_tensors_lock:
+            if (name not in self.sparse_tensors):
+                self.sparse_tensors[name] = convert_sparse_matrix_to_sparse_tensor(X)
+            return self.sparse_tensors[name]
+
+    def _get_resident_arrays(self, value):
+        '''Method to return the arrays which make up `value`, in the order of the variables made by `_make_resident`'''
+        if (isinstance(value, tf.SparseTensorValue)):
+            return [np.asarray(value.indices, dtype=np.int64),
+                    np.asarray(value.values, dtype=np.float32),
+                    np.asarray(value.dense_shape, dtype=np.int64)]
+        return [np.asarray(value)]
+
+    def _make_resident(self, value, name):
+        '''
+        Method to make a non-trainable variable (or a SparseTensor of variables) for holding `value`. The variables are
+        initialised, by `initialize`, from placeholders so that the values are not serialised into the graph definition.
+        Only the first dimension is left unknown so that the values of another split can be loaded later.
+        '''
+        if (isinstance(value, tf.SparseTensorValue)):
+            indices, values, dense_shape = self._get_resident_arrays(value)
+            return tf.SparseTensor(indices=self._make_resident(indices, name=name + "_indices"),
+                                   values=self._make_resident(values, name=name + "_values"),
+                                   dense_shape=self._make_resident(dense_shape, name=name + "_dense_shape"))
+        value = np.asarray(value)
+        shape = (None,) + value.shape[1:] if value.ndim else ()
+        initial_value = tf.placeholder(tf.as_dtype(value.dtype), shape=shape)
+        self.resident_placeholders.append(initial_value)
+        # The variable is kept out of the global variables so that tf.global_variables_initializer does not touch it
+        variable = tf.Variable(initial_value, trainable=False, collections=[RESIDENT_DATA], validate_shape=False,
+                               name=name)
+        self.resident_variables.append(variable)
+        tensor = tf.identity(variable)
+        tensor.set_shape(shape)
+        return tensor
+
+    def _build_graph_resident(self, feed_dicts):
+        '''
+        Method to make the variables for the values in `feed_dicts` and to replace the placeholders in the placeholder
+        dict with them. Values shared across the modes (like the features and the supports) get a single variable.
+        '''
+        if (MODE not in self.placeholder_dict):
+            self.placeholder_dict[MODE] = tf.placeholder(tf.string, shape=(), name=MODE)
+        # The placeholders which the resident data replaces, for preparing the feed dicts again
+        self.input_placeholder_dict = dict(self.placeholder_dict)
+        mode_placeholder = self.placeholder_dict[MODE]
+        selector_placeholders = [mode_placeholder, self.placeholder_dict[DROPOUT]]
+
+        resident_values = {}
+        resident_tensors = {}
+        with tf.name_scope(RESIDENT_DATA):
+            for placeholder in self.train_feed_dict:
+                if (any(placeholder is selector for selector in selector_placeholders)):
+                    continue
+                tensors = {}
+                for mode, feed_dict in feed_dicts.items():
+                    value = feed_dict[placeholder]
+                    if (id(value) not in resident_values):
+                        first_placeholder = len(self.resident_placeholders)
+                        resident_values[id(value)] = self._make_resident(value,
+                                                                         name="data" + str(len(resident_values)))
+                        self.resident_sources.append(
+                            (placeholder, mode, self.resident_placeholders[first_placeholder:]))
+                    tensors[mode] = resident_values[id(value)]
+                resident_tensors[placeholder] = select_by_mode(mode=mode_placeholder, tensors=tensors)
+
+        for key, placeholder in list(self.placeholder_dict.items()):
+            if (key == SUPPORTS):
+                self.placeholder_dict[SUPPORTS] = [resident_tensors[support] for support in placeholder]
+            elif (placeholder in resident_tensors):
+                self.placeholder_dict[key] = resident_tensors[placeholder]
+
+        self.resident_init_op = tf.variables_initializer(self.resident_variables)
+
+    def _make_graph_resident(self):
+        '''
+        Method to move the features, supports, labels and masks from the feed dicts to variables which are loaded by
+        `initialize`. The placeholder dict then holds these variables and the feed dicts only select the mode and the
+        dropout rate. The variables are made only once, so when the feed dicts are prepared again (like for another edge
+        split) against `input_placeholder_dict`, only the values which `initialize` loads into the variables change.
+        '''
+        feed_dicts = {
+            TRAIN: self.train_feed_dict,
+            VALIDATION: self.validation_feed_dict,
+            TEST: self.test_feed_dict
+        }
+
+        if (self.resident_init_op is None):
+            self._build_graph_resident(feed_dicts)
+
+        self.resident_feed_dict = {}
+        for placeholder, mode, initial_values in self.resident_sources:
+            for initial_value, array in zip(initial_values,
+                                            self._get_resident_arrays(feed_dicts[mode][placeholder])):
+                self.resident_feed_dict[initial_value] = array
+
+        selector_placeholders = [self.placeholder_dict[MODE], self.placeholder_dict[DROPOUT]]
+        for mode, feed_dict in feed_dicts.items():
+            selector_feed_dict = {self.placeholder_dict[MODE]: mode}
+            for selector in selector_placeholders:
+                if (selector in feed_dict):
+                    selector_feed_dict[selector] = feed_dict[selector]
+            feed_dict.clear()
+            feed_dict.update(selector_feed_dict)
+
+    def initialize(self, sess):
+        '''
+        Method to load the resident graph data into `sess`. This has to be called once per session, and again whenever
+        the feed dicts are prepared again, before running the models. It is a no-op unless model_params.resident_graph
+        is set. Running the initializers again assigns the new values to the existing variables.
+        '''
+        if (self.resident_init_op is not None):
+            sess.run(self.resident_init_op, feed_dict=self.resident_feed_dict)
+
     def get_feed_dict(self, mode=TRAIN):
         if mode == TRAIN:
             return self.train_feed_dict
@@ -154,7 +295,6 @@ class DataPipeline():
 
     def get_sparse_model_params(self):
         return SparseModelParams(
-                num_elements=self.num_elements,
                 feature_size=self.feature_size
             )
 
@@ -165,10 +305,40 @@ def map_indices_to_mask(indices, mask_size):
     return mask
 
 
+def select_by_mode(mode, tensors):
+    '''Method to select, inside the graph, the (dense or sparse) tensor for `mode` from the dict `tensors`'''
+    modes = list(tensors.keys())
+    if (all(tensors[_mode] is tensors[modes[0]] for _mode in modes)):
+        return tensors[modes[0]]
+    if (isinstance(tensors[modes[0]], tf.SparseTensor)):
+        return tf.SparseTensor(
+            indices=select_by_mode(mode, {_mode: tensor.indices for _mode, tensor in tensors.items()}),
+            values=select_by_mode(mode, {_mode: tensor.values for _mode, tensor in tensors.items()}),
+            dense_shape=select_by_mode(mode, {_mode: tensor.dense_shape for _mode, tensor in tensors.items()}))
+    selected = tf.identity(tensors[modes[0]])
+    for _mode in modes[1:]:
+        selected = tf.cond(tf.equal(mode, _mode),
+                           true_fn=lambda tensor=tensors[_mode]: tf.identity(tensor),
+                           false_fn=lambda tensor=selected: tf.identity(tensor))
+    return selected
+
+
 def convert_sparse_matrix_to_sparse_tensor(X):
     '''
-    code borrowed from https://stackoverflow.com/questions/40896157/scipy-sparse-csr-matrix-to-tensorflow-sparsetensor-mini-batch-gradient-descent
+    Method to convert the scipy sparse matrix `X` to a SparseTensorValue.
+    The indices are built as a single contiguous int64 array, in the row major order that tensorflow expects, and the
+    values share the memory (and the dtype) of `X.data` when `X` is a canonical CSR matrix.
     '''
-    coo = X.tocoo()
-    indices = np.mat([coo.row, coo.col]).transpose()
-    return tf.SparseTensorValue(indices, coo.data, coo.shape)
\ No newline at end of file
+    if (not sp.issparse(X)):
+        X = sp.csr_matrix(X)
+
+    csr = X.tocsr()
+    if (not csr.has_sorted_indices):
+        if (csr is X):
+            csr = csr.copy()
+        csr.sort_indices()
+
+    indices = np.empty((csr.nnz, 2), dtype=np.int64)
+    indices[:, 0] = np.repeat(np.arange(csr.shape[0], dtype=np.int64), np.diff(csr.indptr))
+    indices[:, 1] = csr.indices
+    return tf.SparseTensorValue(indices, csr.data, csr.shape)
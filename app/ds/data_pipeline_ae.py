@@ -3,17 +3,21 @@ import scipy.sparse as sp
 import tensorflow as tf
 
 from app.ds.data_pipeline import DataPipeline, convert_sparse_matrix_to_sparse_tensor
+from app.ds.split_store import EdgeSplitStore
 from app.model.params import AutoEncoderModelParams
 from app.utils.constant import TRAIN, LABELS, FEATURES, SUPPORTS, MASK, VALIDATION, \
-    TEST, DROPOUT, GCN_AE, MODE, NORMALISATION_CONSTANT, GCN_VAE
+    TEST, DROPOUT, GCN_AE, MODE, NORMALISATION_CONSTANT, GCN_VAE, PAIRS, PAIR_LABELS
 
 
 class DataPipelineAE(DataPipeline):
     '''Class for managing the data pipeline'''
 
-    def __init__(self, model_params, data_dir, dataset_name):
+    def __init__(self, model_params, data_dir, dataset_name, split_seed=None):
 
         self.autoencoder_model_params = None
+        # Seed for the edge split. If it is set along with the cache_dir, the split is read from the EdgeSplitStore.
+        self.split_seed = split_seed
+        self.split_store = None
         super(DataPipelineAE, self).__init__(model_params=model_params, data_dir=data_dir,
                                              dataset_name=dataset_name)
 
@@ -36,6 +40,10 @@ class DataPipelineAE(DataPipeline):
 
         mode_placeholder = tf.placeholder(tf.string, name=MODE)
 
+        # Node pairs in the validation or test split and their labels, for scoring only these pairs at evaluation
+        pairs_placeholder = tf.placeholder(tf.int64, shape=(None, 2), name=PAIRS)
+        pair_labels_placeholder = tf.placeholder(tf.float32, shape=(None,), name=PAIR_LABELS)
+
         normalisation_constant_placeholder = tf.placeholder_with_default(0.5, shape=(), name=NORMALISATION_CONSTANT)
 
         support_placeholder = []
@@ -50,20 +58,35 @@ class DataPipelineAE(DataPipeline):
             MASK: mask_placeholder,
             DROPOUT: dropout_placeholder,
             MODE: mode_placeholder,
+            PAIRS: pairs_placeholder,
+            PAIR_LABELS: pair_labels_placeholder,
             NORMALISATION_CONSTANT: normalisation_constant_placeholder
         }
 
-    def _prepare_feed_dict(self, labels, features, mask_indices, dropout, mode):
-
-        mask = convert_sparse_matrix_to_sparse_tensor(
-            sp.csr_matrix((np.ones(len(mask_indices)), (mask_indices[:, 0], mask_indices[:, 1])),
+    def _prepare_mask(self, mask_indices):
+        '''Method to convert the edge `mask_indices` to a sparse mask over the adjacency matrix'''
+        return convert_sparse_matrix_to_sparse_tensor(
+            sp.csr_matrix((np.ones(len(mask_indices), dtype=np.float32), (mask_indices[:, 0], mask_indices[:, 1])),
                           shape=self.graph.adj.shape))
 
+    def _prepare_pairs(self, mask):
+        '''
+        Method to return the node pairs in the sparse `mask` along with their labels looked up in the adjacency matrix.
+        The pairs are in the same order as the mask indices so that the models can line up the labels with the mask.
+        '''
+        pairs = mask.indices
+        pair_labels = (np.asarray(self.graph.adj[pairs[:, 0], pairs[:, 1]]).ravel() != 0).astype(np.float32)
+        return pairs, pair_labels
+
+    def _prepare_feed_dict(self, labels, features, mask, pairs, dropout, mode):
+
         placeholder_dict = self.placeholder_dict
         feed_dict = {
             placeholder_dict[LABELS]: labels,
             placeholder_dict[FEATURES]: features,
             placeholder_dict[MASK]: mask,
+            placeholder_dict[PAIRS]: pairs[0],
+            placeholder_dict[PAIR_LABELS]: pairs[1],
             placeholder_dict[DROPOUT]: dropout,
             placeholder_dict[MODE]: mode
         }
@@ -74,18 +97,27 @@ class DataPipelineAE(DataPipeline):
 
     def _prepare_data_auto_encoder(self, dataset_splits, shuffle_data=False):
 
-        self._set_placeholder_dict()
-
-        adj, train_index, val_index, test_index = self.graph.get_edge_mask(dataset_splits, shuffle_data=shuffle_data)
-
-        features = self.graph.features
-        supports = self.graph.compute_supports(model_params=self.model_params, adj=adj)
-
-        if (self.model_params.sparse_features):
-            self.num_elements = features.nnz
-
-        features = convert_sparse_matrix_to_sparse_tensor(features)
-        labels = convert_sparse_matrix_to_sparse_tensor(self.graph.adj)
+        # The placeholders are kept when the pipeline switches to another split
+        if (not self.placeholder_dict):
+            self._set_placeholder_dict()
+
+        # An explicit edge_split_path takes precedence over the splits cached by the EdgeSplitStore
+        if (self.model_params.cache_dir and self.split_seed is not None and not self.model_params.edge_split_path):
+            if (self.split_store is None):
+                self.split_store = EdgeSplitStore(adj=self.graph.adj,
+                                                  model_params=self.model_params,
+                                                  dataset_splits=dataset_splits,
+                                                  seeds=self.model_params.split_seeds or [self.split_seed])
+            adj, train_index, val_index, test_index, supports = self.split_store.get_split(self.split_seed)
+        else:
+            adj, train_index, val_index, test_index = self.graph.get_edge_mask(
+                dataset_splits, shuffle_data=shuffle_data, split_path=self.model_params.edge_split_path,
+                seed=self.split_seed)
+            supports = self.graph.compute_supports(model_params=self.model_params, adj=adj)
+
+        # The features and the full adjacency matrix are converted once and shared by all the splits
+        features = self._get_sparse_tensor(FEATURES, self.graph.features)
+        labels = self._get_sparse_tensor(LABELS, self.graph.adj)
         labels_train = convert_sparse_matrix_to_sparse_tensor(adj)
 
         self.supports = list(
@@ -122,24 +154,49 @@ class DataPipelineAE(DataPipeline):
         [[labels, labels_train, features],
          [train_index, val_index, test_index]] = self._prepare_data(dataset_splits=dataset_splits)
 
+        # The masks are converted once and shared across the feed dicts
+        val_mask = self._prepare_mask(val_index)
+        test_mask = self._prepare_mask(test_index)
+        val_pairs = self._prepare_pairs(val_mask)
+        test_pairs = self._prepare_pairs(test_mask)
+
         self.train_feed_dict = self._prepare_feed_dict(labels=labels_train,
                                                        features=features,
-                                                       mask_indices=val_index,
+                                                       mask=val_mask,
+                                                       pairs=val_pairs,
                                                        dropout=self.model_params.dropout,
                                                        mode=TRAIN)
         # we are actually passing mask_indices for training data as val_index as the mask is ignored for the train data
 
         self.validation_feed_dict = self._prepare_feed_dict(labels=labels,
                                                             features=features,
-                                                            mask_indices=val_index,
+                                                            mask=val_mask,
+                                                            pairs=val_pairs,
                                                             dropout=0,
                                                             mode=VALIDATION)
 
         self.test_feed_dict = self._prepare_feed_dict(labels=labels,
                                                       features=features,
-                                                      mask_indices=test_index,
+                                                      mask=test_mask,
+                                                      pairs=test_pairs,
                                                       dropout=0,
                                                       mode=TEST)
 
+    def set_split_seed(self, split_seed):
+        '''
+        Method to switch the feed dicts to the edge split for `split_seed`. The graph, the placeholders and the split
+        store are reused so only the split and its supports are read.
+        '''
+        self.split_seed = split_seed
+        placeholder_dict = self.placeholder_dict
+        if (self.model_params.resident_graph):
+            # The feed dicts are prepared for the placeholders which the resident data replaced
+            self.placeholder_dict = self.input_placeholder_dict
+        self._populate_feed_dicts()
+        if (self.model_params.resident_graph):
+            # The resident variables are kept and only their values change
+            self.placeholder_dict = placeholder_dict
+            self._make_graph_resident()
+
     def get_autoencoder_model_params(self):
         return self.autoencoder_model_params
@@ -0,0 +1,273 @@
+import numpy as np
+import tensorflow as tf
+from scipy import sparse as sp
+
+from app.ds.data_pipeline import DataPipeline, convert_sparse_matrix_to_sparse_tensor
+from app.ds.graph.preprocessed_graph import Graph
+from app.ds.history import HistoricalEmbeddingStore
+from app.ds.sampler import NeighborSampler, ClusterSampler, prefetch
+from app.utils.constant import TRAIN, LABELS, FEATURES, SUPPORTS, MASK, VALIDATION, TEST, DROPOUT, LAYER_SUPPORTS, \
+    HISTORICAL_EMBEDDINGS
+
+
+class DataPipelineMiniBatch(DataPipeline):
+    '''
+    Class for managing the data pipeline for the mini-batch training of the node classifiers.
+    Every mini-batch is a set of seed nodes along with, for every graph convolution layer, the blocks of the supports
+    sampled by the NeighborSampler. If model_params.num_clusters is set, the training mini-batches are the subgraphs
+    induced by a few clusters of the graph instead. If model_params.historical_embeddings is set, every mini-batch uses
+    the full rows of its nodes and the hidden activations of the out of batch neighbors are read from a
+    HistoricalEmbeddingStore. The feed dicts for the mini-batches are prepared by background threads.
+    '''
+
+    def __init__(self, model_params, data_dir, dataset_name):
+        self.sampler = None
+        self.cluster_sampler = None
+        self.uncached_graph = None
+        self.is_train_node = None
+        self.history = None
+        # Number of hidden layers which keep the historical embeddings, that is all but the last graph convolution layer
+        self.history_layers = 0
+        if (model_params.historical_embeddings):
+            self.history_layers = len(model_params.fanouts) - 1
+        self.labels = None
+        self.split_index = {}
+        super(DataPipelineMiniBatch, self).__init__(model_params=model_params, data_dir=data_dir,
+                                                    dataset_name=dataset_name)
+
+    def _set_placeholder_dict(self):
+        '''Method to set the placeholders, with one set of supports per graph convolution layer'''
+        super(DataPipelineMiniBatch, self)._set_placeholder_dict()
+
+        layer_support_placeholder = []
+        for layer in range(len(self.model_params.fanouts)):
+            layer_support_placeholder.append(
+                [tf.sparse_placeholder(tf.float32, name=SUPPORTS + str(i) + "_layer" + str(layer))
+                 for i in range(self.support_size)])
+
+        self.placeholder_dict[LAYER_SUPPORTS] = layer_support_placeholder
+        if (layer_support_placeholder):
+            self.placeholder_dict[SUPPORTS] = layer_support_placeholder[0]
+
+        if (self.history_layers):
+            # The sizes of the hidden layers are only known to the model
+            self.placeholder_dict[HISTORICAL_EMBEDDINGS] = [
+                tf.placeholder(tf.float32, shape=(None, None), name=HISTORICAL_EMBEDDINGS + "_layer" + str(layer + 1))
+                for layer in range(self.history_layers)]
+
+    def _populate_feed_dicts(self, dataset_splits=[140, 500, 1000]):
+        '''Method to prepare the sampler. The feed dicts are prepared per mini-batch by `get_batches`.'''
+
+        self._set_placeholder_dict()
+
+        self.labels = self.graph.labels
+
+        if (self.graph.preprocessed):
+            train_index, val_index, test_index = self.graph.read_data(dataset_name=self.dataset_name,
+                                                                      data_dir=self.data_dir)
+        else:
+            train_index, val_index, test_index = self.graph.get_node_mask(dataset_splits=dataset_splits)
+        self.split_index = {
+            TRAIN: np.asarray(train_index),
+            VALIDATION: np.asarray(val_index),
+            TEST: np.asarray(test_index)
+        }
+
+        if (self.model_params.fanouts):
+            self.sampler = NeighborSampler(self.graph.compute_supports(model_params=self.model_params))
+
+        if (self.model_params.num_clusters > 0):
+            # A graph without a cache_dir is enough to compute the supports which are not cached
+            self.uncached_graph = Graph(model_name=self.model_params.model_name)
+            self.cluster_sampler = ClusterSampler(graph=self.graph, model_params=self.model_params,
+                                                  compute_supports=self._compute_supports)
+
+        if (self.cluster_sampler is not None or self.history_layers):
+            self.is_train_node = np.zeros(self.node_size, dtype=bool)
+            self.is_train_node[self.split_index[TRAIN]] = True
+
+    def _compute_supports(self, adj, cache):
+        '''Method to compute the supports of `adj`, which are cached on disk only if `cache` is set'''
+        if (cache):
+            return self.graph.compute_supports(model_params=self.model_params, adj=adj)
+        return self.uncached_graph.compute_supports(model_params=self.model_params, adj=adj)
+
+    def _get_features(self, nodes):
+        '''
+        Method to read the feature rows of `nodes` in the format the model expects. The memory-mapped features keep
+        the format they have on disk so only the rows of the mini-batch are converted.
+        '''
+        features = self.features[nodes]
+        if (self.model_params.sparse_features):
+            return convert_sparse_matrix_to_sparse_tensor(features)
+        if (sp.issparse(features)):
+            return features.toarray()
+        return features
+
+    def _prepare_batch_feed_dict(self, seeds, fanouts, dropout, random_state):
+        '''Method to sample the blocks for `seeds` and prepare the feed dict for the mini-batch'''
+        input_nodes, blocks = seeds, []
+        if (self.sampler is not None):
+            input_nodes, blocks = self.sampler.sample(seeds, fanouts=fanouts, random_state=random_state)
+
+        features = self._get_features(input_nodes)
+
+        placeholder_dict = self.placeholder_dict
+        feed_dict = {
+            placeholder_dict[LABELS]: self.labels[seeds],
+            placeholder_dict[FEATURES]: features,
+            placeholder_dict[MASK]: np.arange(len(seeds), dtype=np.int32),
+            placeholder_dict[DROPOUT]: dropout
+        }
+        for layer, layer_blocks in enumerate(blocks):
+            for i, block in enumerate(layer_blocks):
+                feed_dict[placeholder_dict[LAYER_SUPPORTS][layer][i]] = convert_sparse_matrix_to_sparse_tensor(block)
+
+        return feed_dict
+
+    def _prepare_cluster_feed_dict(self, clusters):
+        '''
+        Method to prepare the feed dict for the subgraph induced by `clusters`. All the layers use the supports of the
+        subgraph and the loss is computed over the training nodes in the subgraph.
+        '''
+        nodes, supports = self.cluster_sampler.sample(clusters)
+
+        features = self._get_features(nodes)
+        mask = np.nonzero(self.is_train_node[nodes])[0].astype(np.int32)
+
+        placeholder_dict = self.placeholder_dict
+        feed_dict = {
+            placeholder_dict[LABELS]: self.labels[nodes],
+            placeholder_dict[FEATURES]: features,
+            placeholder_dict[MASK]: mask,
+            placeholder_dict[DROPOUT]: self.model_params.dropout
+        }
+        supports = [convert_sparse_matrix_to_sparse_tensor(support) for support in supports]
+        for layer_support_placeholder in placeholder_dict[LAYER_SUPPORTS]:
+            for i, support in enumerate(supports):
+                feed_dict[layer_support_placeholder[i]] = support
+
+        return feed_dict, mask.shape[0], nodes
+
+    def _prepare_history_feed_dict(self, nodes, mask, dropout):
+        '''
+        Method to prepare the feed dict for the mini-batch of `nodes`, with the loss computed over the positions `mask`.
+        All the layers use the full rows of `nodes`. The first layer reads the features of `nodes` and of their out of
+        batch neighbors while the later layers read the historical embeddings of these neighbors.
+        '''
+        halo, blocks = self.sampler.sample_halo(nodes)
+
+        features = self._get_features(np.concatenate((nodes, halo)))
+
+        placeholder_dict = self.placeholder_dict
+        feed_dict = {
+            placeholder_dict[LABELS]: self.labels[nodes],
+            placeholder_dict[FEATURES]: features,
+            placeholder_dict[MASK]: mask,
+            placeholder_dict[DROPOUT]: dropout
+        }
+        blocks = [convert_sparse_matrix_to_sparse_tensor(block) for block in blocks]
+        for layer_support_placeholder in placeholder_dict[LAYER_SUPPORTS]:
+            for i, block in enumerate(blocks):
+                feed_dict[layer_support_placeholder[i]] = block
+        for layer, history_placeholder in enumerate(placeholder_dict[HISTORICAL_EMBEDDINGS]):
+            feed_dict[history_placeholder] = self.history.pull(layer, halo)
+
+        return feed_dict, mask.shape[0], nodes
+
+    def _get_history_batches(self, mode):
+        '''
+        Method to iterate over the (feed dict, batch size, nodes) triples for the mini-batches of `mode` with the
+        historical embeddings. The training mini-batches cover all the nodes (grouped by clusters if the graph is
+        partitioned) so that every historical embedding is refreshed once per epoch, and their loss is computed over the
+        training nodes only.
+        '''
+        batch_size = self.model_params.batch_size
+        if (mode == TRAIN):
+            if (self.cluster_sampler is not None):
+                groups = [np.sort(np.concatenate([self.cluster_sampler.cluster_nodes[cluster] for cluster in clusters]))
+                          for clusters in
+                          self.cluster_sampler.get_batches(clusters_per_batch=self.model_params.clusters_per_batch)]
+            else:
+                index = np.random.permutation(self.node_size)
+                groups = [index[start:start + batch_size] for start in range(0, len(index), batch_size)]
+            jobs = [(nodes, np.nonzero(self.is_train_node[nodes])[0].astype(np.int32), self.model_params.dropout)
+                    for nodes in groups]
+        else:
+            index = self.split_index[mode]
+            jobs = [(index[start:start + batch_size], np.arange(len(index[start:start + batch_size]), dtype=np.int32), 0)
+                    for start in range(0, len(index), batch_size)]
+
+        return prefetch(lambda job: self._prepare_history_feed_dict(*job), jobs,
+                        num_workers=self.model_params.num_workers, prefetch_size=self.model_params.prefetch_size)
+
+    def init_history(self, sizes):
+        '''
+        Method to start new historical embeddings for the hidden layers of sizes `sizes`, dropping the previous ones.
+        This has to be called for every new model before iterating over its mini-batches and is a no-op unless
+        model_params.historical_embeddings is set.
+        '''
+        self.release_history()
+        if (self.history_layers):
+            if (len(sizes) != self.history_layers):
+                raise ValueError("Expected the sizes of " + str(self.history_layers) + " hidden layers, got " +
+                                 str(len(sizes)))
+            mmap_dir = self.model_params.cache_dir if self.model_params.mmap_history else None
+            self.history = HistoricalEmbeddingStore(node_count=self.node_size, sizes=sizes, mmap_dir=mmap_dir)
+
+    def release_history(self):
+        '''Method to drop the historical embeddings along with their memory-mapped files'''
+        if (self.history is not None):
+            self.history.release()
+            self.history = None
+
+    def update_history(self, nodes, activations):
+        '''Method to write the hidden `activations` of the mini-batch `nodes` to the historical embeddings'''
+        for layer, values in enumerate(activations):
+            self.history.push(layer, nodes, values)
+
+    def _get_cluster_batches(self):
+        '''Method to iterate over the (feed dict, batch size, nodes) triples for an epoch of the cluster mini-batches'''
+        jobs = [clusters for clusters in
+                self.cluster_sampler.get_batches(clusters_per_batch=self.model_params.clusters_per_batch)
+                # Subgraphs without any training node do not contribute to the loss
+                if any(np.any(self.is_train_node[self.cluster_sampler.cluster_nodes[cluster]]) for cluster in clusters)]
+        return prefetch(self._prepare_cluster_feed_dict, jobs, num_workers=self.model_params.num_workers,
+                        prefetch_size=self.model_params.prefetch_size)
+
+    def get_batches(self, mode=TRAIN):
+        '''
+        Method to iterate over the (feed dict, batch size, nodes) triples for the mini-batches of `mode`, where nodes
+        are the output nodes of the mini-batch.
+        The training nodes are shuffled and use the sampled fan-outs, while the validation and test nodes use the full
+        neighborhoods. The random seeds for the batches are drawn upfront so that the batches do not depend on the order
+        in which the workers run.
+        '''
+        if (self.history_layers):
+            if (self.history is None):
+                raise ValueError("init_history has to be called before iterating over the mini-batches")
+            return self._get_history_batches(mode)
+        if (mode == TRAIN and self.cluster_sampler is not None):
+            return self._get_cluster_batches()
+
+        index = self.split_index[mode]
+        fanouts = [0] * len(self.model_params.fanouts)
+        dropout = 0
+        if (mode == TRAIN):
+            index = np.random.permutation(index)
+            fanouts = self.model_params.fanouts
+            dropout = self.model_params.dropout
+
+        batch_size = self.model_params.batch_size
+        jobs = [(index[start:start + batch_size], seed) for start, seed in
+                zip(range(0, len(index), batch_size),
+                    np.random.randint(np.iinfo(np.int32).max, size=(len(index) + batch_size - 1) // batch_size))]
+
+        def _prepare(job):
+            seeds, seed = job
+            feed_dict = self._prepare_batch_feed_dict(seeds, fanouts=fanouts, dropout=dropout,
+                                                      random_state=np.random.RandomState(seed))
+            return feed_dict, len(seeds), seeds
+
+        return prefetch(_prepare, jobs, num_workers=self.model_params.num_workers,
+                        prefetch_size=self.model_params.prefetch_size)
@@ -1,18 +1,28 @@
 import os
 from abc import ABC, abstractmethod
+from itertools import islice
+from multiprocessing import Pool
 
 import numpy as np
 from scipy import sparse as sp
 from scipy.sparse.linalg.eigen.arpack import eigsh
 
-from app.utils.constant import GCN, NETWORK, LABEL, FEATURE,SYMMETRIC, GCN_POLY
-from app.utils.util import invert_dict, map_set_to_khot_vector, map_list_to_floats
+from app.utils.cache import fingerprint_files, fingerprint_sparse_matrix, get_cache_path, is_valid_cache, \
+    save_arrays, load_arrays, write_cache
+from app.utils.constant import GCN, NETWORK, LABEL, FEATURE,SYMMETRIC, GCN_POLY, SUPPORTS, ARPACK, ANALYTIC, \
+    POWER_ITERATION
+from app.utils.util import invert_dict, map_list_to_floats, SparseRowSetView
+
+
+# Names of the arrays in the edge split files
+EDGE_SPLIT_NAMES = ["train_edges", "validation_edges", "test_edges",
+                    "validation_edges_negative_sample", "test_edges_negative_sample"]
 
 
 class Base_Graph(ABC):
     '''Base class for the graph data structure'''
 
-    def __init__(self, model_name=GCN, sparse_features=True):
+    def __init__(self, model_name=GCN, sparse_features=True, cache_dir=None, mmap_features=False):
         '''Method to initialise the graph'''
         self.preprocessed = False
         self.features = None
@@ -41,61 +51,42 @@ class Base_Graph(ABC):
 
         self.edge_count = -1
 
+        # Directory for the binary cache of the parsed graph. Caching is disabled when it is None.
+        self.cache_dir = cache_dir
+
+        # If set, the features are converted once to an on-disk matrix in `cache_dir` and then memory-mapped.
+        self.mmap_features = mmap_features
+
     def read_labels(self, label_data_path):
         '''
         Method to read the lables from `data_path`
         '''
         print("Reading labels from", str(label_data_path))
-        data = np.genfromtxt(label_data_path, dtype=np.dtype(str))
-
-        label_to_id_map = {label: id for id, label in enumerate(
-            set(
-                list(
-                    map(lambda _data: _data[1], data)
-                )
-            )
-        )}
-
-        node_to_id_map = {node: id for id, node in enumerate(
-            set(
-                list(
-                    map(lambda _data: _data[0], data)
-                )
-            )
-        )}
-
-        node_to_label_map = {}
-        label_to_node_map = {}
-
-        for node, label in map(lambda _data: (node_to_id_map[_data[0]], label_to_id_map[_data[1]]), data):
-            if node not in node_to_label_map:
-                node_to_label_map[node] = set()
-            node_to_label_map[node].add(label)
-            if label not in label_to_node_map:
-                label_to_node_map[label] = set()
-            label_to_node_map[label].add(node)
-
-        label_count = len(label_to_id_map.keys())
-
-        labels = np.asarray(list(
-            map(lambda index_set: map_set_to_khot_vector(index_set=index_set, num_classes=label_count)
-                , node_to_label_map.values())
-        ))
-
-        assert (len(self.id_to_node_map.keys()) == len(self.node_to_label_map.keys())), \
-            "Some nodes are missing labels or ids"
-
-        assert (len(self.id_to_label_map.keys()) == len(self.label_to_node_map.keys())), \
-            "Some labels are missing nodes or ids"
-
-        node_count = labels.shape[0]
-        label_count = labels.shape[1]
+        with open(label_data_path) as label_file:
+            # Every row is a (node, label) pair
+            data = np.asarray(split_text_rows(label_file, column_count=2), dtype=str).reshape(-1, 2)
+
+        # Ids are assigned in the sorted order of the node and label names
+        nodes, node_ids = np.unique(data[:, 0], return_inverse=True)
+        label_names, label_ids = np.unique(data[:, 1], return_inverse=True)
+
+        node_count = nodes.shape[0]
+        label_count = label_names.shape[0]
+
+        # k-hot labels built as a nodes X labels sparse matrix. Repeated (node, label) rows are summed up so we reset
+        # them.
+        labels = sp.csr_matrix((np.ones(node_ids.shape[0], dtype=np.int32), (node_ids, label_ids)),
+                               shape=(node_count, label_count))
+        labels.sum_duplicates()
+        labels.data[:] = 1
+
+        label_to_id_map = dict(zip(label_names.tolist(), range(label_count)))
+        node_to_id_map = dict(zip(nodes.tolist(), range(node_count)))
 
         # Updating all the class variables in one place
         self.label_to_id_map = label_to_id_map
         self.node_to_id_map = node_to_id_map
-        self.node_to_label_map = node_to_label_map
-        self.label_to_node_map = label_to_node_map
+        self._set_label_maps(labels)
 
         self.id_to_label_map, self.id_to_node_map = list(
             map(lambda _dict: invert_dict(_dict), [
@@ -103,11 +94,17 @@ class Base_Graph(ABC):
             ])
         )
 
-        self.labels = labels
+        # The labels are exposed as a dense k-hot matrix, which is what the models and the feed dicts expect
+        self.labels = labels.toarray()
 
         print("{} nodes read.".format(node_count))
         print("{} labels read.".format(label_count))
 
+    def _set_label_maps(self, labels):
+        '''Method to set the node to labels and label to nodes maps as lazy views over the k-hot `labels` matrix'''
+        self.node_to_label_map = SparseRowSetView(labels)
+        self.label_to_node_map = SparseRowSetView(labels, transpose=True)
+
     def read_features(self, feature_data_path, one_hot=False, dim=100):
         '''
         Method to read the features from `feature_data_path`
@@ -116,7 +113,10 @@ class Base_Graph(ABC):
 
         node_count = len(self.id_to_node_map.keys())
 
-        if (feature_data_path):
+        if (feature_data_path and self.mmap_features):
+            features = self._read_memmap_features(feature_data_path)
+
+        elif (feature_data_path):
             features = np.genfromtxt(feature_data_path, dtype=np.dtype(str))
             features = np.asarray(
                 list(map(map_list_to_floats, features[:, 1:])), dtype=np.int32)
@@ -139,6 +139,21 @@ class Base_Graph(ABC):
         self.features = features
         print("{} features read for each node.".format(self.features.shape[1]))
 
+    def _read_memmap_features(self, feature_data_path):
+        '''
+        Method to read the features from `feature_data_path` as a memory-mapped matrix.
+        The text file is converted only the first time. Later runs (and concurrent processes) map the same files.
+        The on-disk format is chosen by size so it might not match `sparse_features`. The matrix is still returned in
+        that format, as converting it would load it in memory, and the mini-batch pipelines convert just the rows they
+        read.
+        '''
+        assert (self.cache_dir), "cache_dir needs to be set for memory-mapping the features"
+        cache_path = get_cache_path(self.cache_dir, FEATURE, fingerprint_files([feature_data_path]))
+        if (not is_valid_cache(cache_path)):
+            print("Converting features to", str(cache_path))
+            write_cache(cache_path, lambda path: convert_features_to_memmap(feature_data_path, path))
+        return load_memmap_features(cache_path)
+
     def read_data(self, data_dir=None, dataset_name=None):
         '''
         Method to read the data corresponding to `dataset_name` from `data_dir`
@@ -154,10 +169,75 @@ class Base_Graph(ABC):
         data_path_map[LABEL] = os.path.join(data_path, "label.txt")
         data_path_map[FEATURE] = os.path.join(data_path, "feature.txt")
 
+        cache_path = None
+        if (self.cache_dir):
+            # The features are only kept in the cache when they are not memory-mapped from their own cache
+            fingerprint = fingerprint_files([data_path_map[NETWORK], data_path_map[LABEL], data_path_map[FEATURE]],
+                                            extra=[self.mmap_features])
+            cache_path = get_cache_path(self.cache_dir, dataset_name, fingerprint)
+            if (is_valid_cache(cache_path)):
+                print("Reading cached data from", str(cache_path))
+                if (self._load_cache(cache_path, feature_data_path=data_path_map[FEATURE])):
+                    return
+                print("Rebuilding the cached data as it does not have the features")
+
         self.read_labels(label_data_path=data_path_map[LABEL])
         self.read_features(feature_data_path=data_path_map[FEATURE])
         self.read_network(network_data_path=data_path_map[NETWORK])
 
+        if (cache_path):
+            self._save_cache(cache_path)
+
+    def _save_cache(self, cache_path):
+        '''Method to save the parsed graph to the binary cache at `cache_path`'''
+        node_count = len(self.id_to_node_map.keys())
+        label_count = len(self.id_to_label_map.keys())
+        arrays = {
+            "adj": sp.csr_matrix(self.adj),
+            "labels": sp.csr_matrix(self.labels),
+            "nodes": np.asarray([self.id_to_node_map[id] for id in range(node_count)]),
+            "label_names": np.asarray([self.id_to_label_map[id] for id in range(label_count)]),
+            "edge_count": np.asarray(self.edge_count)
+        }
+        if (not self.mmap_features):
+            # Memory-mapped features already live in their own cache
+            arrays["features"] = self.features
+        save_arrays(cache_path, arrays)
+
+    def _load_cache(self, cache_path, feature_data_path):
+        '''
+        Method to populate the graph from the binary cache at `cache_path`.
+        Returns False, without populating the graph, if the features are needed but missing from the cache.
+        '''
+        arrays = load_arrays(cache_path, ["adj", "features", "labels", "nodes", "label_names", "edge_count"])
+
+        features = arrays["features"]
+        if (features is None and not self.mmap_features):
+            return False
+        if (self.mmap_features):
+            features = self._read_memmap_features(feature_data_path)
+        elif (self.sparse_features):
+            features = sp.csr_matrix(features)
+        elif (sp.issparse(features)):
+            features = features.todense()
+
+        self.node_to_id_map = {node: id for id, node in enumerate(arrays["nodes"].tolist())}
+        self.label_to_id_map = {label: id for id, label in enumerate(arrays["label_names"].tolist())}
+        self.id_to_label_map, self.id_to_node_map = list(
+            map(lambda _dict: invert_dict(_dict), [
+                self.label_to_id_map, self.node_to_id_map
+            ])
+        )
+
+        labels = sp.csr_matrix(arrays["labels"])
+        self._set_label_maps(labels)
+
+        self.adj = arrays["adj"]
+        self.features = features
+        self.labels = labels.toarray()
+        self.edge_count = int(arrays["edge_count"])
+        return True
+
     @abstractmethod
     def read_network(self, network_data_path):
         '''
@@ -172,14 +252,119 @@ class Base_Graph(ABC):
 
         if(adj is None):
             adj = self.adj
-        if(model_params.model_name==GCN_POLY):
-            supports = compute_chebyshev_polynomial(adj, degree=model_params.support_size - 1)
+
+        cache_path = None
+        if (self.cache_dir):
+            fingerprint = fingerprint_sparse_matrix(adj, extra=[model_params.model_name,
+                                                                model_params.norm_mode,
+                                                                model_params.support_size - 1,
+                                                                model_params.lazy_chebyshev,
+                                                                model_params.lambda_max_mode])
+            cache_path = get_cache_path(self.cache_dir, SUPPORTS, fingerprint)
+            if (is_valid_cache(cache_path)):
+                print("Reading cached supports from", str(cache_path))
+                names = [SUPPORTS + str(i) for i in range(model_params.num_supports)]
+                arrays = load_arrays(cache_path, names)
+                return [arrays[name] for name in names]
+
+        if(model_params.model_name==GCN_POLY and model_params.lazy_chebyshev):
+            # The layers apply the Chebyshev recurrence themselves and only need the scaled laplacian
+            supports = [compute_scaled_laplacian(adj,
+                                                 lambda_max=self.compute_lambda_max(adj, model_params.lambda_max_mode))]
+
+        elif(model_params.model_name==GCN_POLY):
+            supports = compute_chebyshev_polynomial(adj, degree=model_params.support_size - 1,
+                                                    lambda_max=self.compute_lambda_max(adj,
+                                                                                       model_params.lambda_max_mode))
 
         else:
             # GCN, GCN_AE
-            supports = [transform_adj(adj=adj, is_symmetric=True)]
+            supports = [transform_adj(adj=adj, is_symmetric=(model_params.norm_mode == SYMMETRIC))]
+
+        if (cache_path):
+            save_arrays(cache_path, {SUPPORTS + str(i): support for i, support in enumerate(supports)})
         return supports
 
+    def compute_lambda_max(self, adj, lambda_max_mode=ARPACK):
+        '''
+        Method to compute the largest eigenvalue of the normalized laplacian of `adj` using `lambda_max_mode`.
+        The value is cached per adjacency matrix. In the ARPACK mode, the solver is warm-started from the cached
+        eigenvector of a graph with the same number of nodes, if there is one.
+        '''
+        if (lambda_max_mode == ANALYTIC):
+            # The eigenvalues of the normalized laplacian are bounded by 2
+            return 2.0
+
+        cache_path = None
+        warm_start_path = None
+        eigenvector = None
+        if (self.cache_dir):
+            cache_path = get_cache_path(self.cache_dir, "lambda_max",
+                                        fingerprint_sparse_matrix(adj, extra=[lambda_max_mode]))
+            if (is_valid_cache(cache_path)):
+                return float(load_arrays(cache_path, ["lambda_max"])["lambda_max"])
+            warm_start_path = get_cache_path(self.cache_dir, "eigenvector", str(adj.shape[0]))
+            if (is_valid_cache(warm_start_path)):
+                eigenvector = load_arrays(warm_start_path, ["eigenvector"])["eigenvector"]
+
+        lambda_max, eigenvector = estimate_lambda_max(compute_normalized_laplacian(adj),
+                                                      lambda_max_mode=lambda_max_mode,
+                                                      v0=eigenvector)
+
+        if (cache_path):
+            save_arrays(cache_path, {"lambda_max": np.asarray(lambda_max)})
+            if (not is_valid_cache(warm_start_path)):
+                save_arrays(warm_start_path, {"eigenvector": eigenvector})
+        return lambda_max
+
+    def compute_propagated_features(self, model_params):
+        '''
+        Method to compute the features propagated over the normalized adjacency matrix for the SGC model using
+        `propagate_features`. If the graph has a cache_dir, the result is written to the cache once and memory-mapped.
+        '''
+        is_symmetric = (model_params.norm_mode == SYMMETRIC)
+        if (not self.cache_dir):
+            return propagate_features(transform_adj(adj=self.adj, is_symmetric=is_symmetric), self.features,
+                                      num_hops=model_params.num_hops, concat_hops=model_params.concat_hops)
+
+        fingerprint = fingerprint_sparse_matrix(self.adj, extra=[model_params.norm_mode,
+                                                                 model_params.num_hops,
+                                                                 model_params.concat_hops,
+                                                                 fingerprint_sparse_matrix(self.features)])
+        cache_path = get_cache_path(self.cache_dir, "propagated_features", fingerprint)
+        if (is_valid_cache(cache_path)):
+            print("Reading cached propagated features from", str(cache_path))
+        else:
+            def _write(path):
+                hops = model_params.num_hops + 1 if model_params.concat_hops else 1
+                out = np.lib.format.open_memmap(os.path.join(path, "features.npy"), mode="w+", dtype=np.float32,
+                                                shape=(self.features.shape[0], hops * self.features.shape[1]))
+                propagate_features(transform_adj(adj=self.adj, is_symmetric=is_symmetric), self.features,
+                                   num_hops=model_params.num_hops, concat_hops=model_params.concat_hops, out=out)
+                out.flush()
+
+            write_cache(cache_path, _write)
+        return load_arrays(cache_path, ["features"], mmap_mode="r")["features"]
+
+    def compute_partition(self, num_clusters, seed=0):
+        '''
+        Method to partition the graph into `num_clusters` clusters using `partition_graph`.
+        The partition is cached per adjacency matrix.
+        '''
+        cache_path = None
+        if (self.cache_dir):
+            cache_path = get_cache_path(self.cache_dir, "partition",
+                                        fingerprint_sparse_matrix(self.adj, extra=[num_clusters, seed]))
+            if (is_valid_cache(cache_path)):
+                print("Reading cached partition from", str(cache_path))
+                return load_arrays(cache_path, ["partition"])["partition"]
+
+        partition = partition_graph(self.adj, num_clusters=num_clusters, random_state=np.random.RandomState(seed))
+
+        if (cache_path):
+            save_arrays(cache_path, {"partition": partition})
+        return partition
+
     def get_node_mask(self, dataset_splits):
         '''Method to obtain the train, validation and test masks for nodes (labels)'''
 
@@ -195,69 +380,218 @@ class Base_Graph(ABC):
 
         return train_index, val_index, test_index
 
-    def get_edge_mask(self, dataset_splits, adj = None, shuffle_data = True):
-        '''Method to obtain the train, validation and test mask for edges'''
-
-        dataset_splits_sum = sum(dataset_splits)
-        dataset_splits = list(map(lambda x: x / dataset_splits_sum, dataset_splits))
+    def get_edge_mask(self, dataset_splits, adj = None, shuffle_data = True, split_path = None, seed = None):
+        '''
+        Method to obtain the train, validation and test mask for edges.
+        If `split_path` points to an existing split file, the edges and negative samples are read from it instead of
+        being computed. Otherwise, if `split_path` is set, the computed split is saved there for later runs.
+        The `.npz` extension is added to `split_path` if it is missing, as np.savez would. If `seed` is set, it is added
+        to the file name as well (say `split-1.npz` for `split.npz`) so that every seed keeps its own split.
+        '''
 
         if(adj is None):
             adj = self.adj
 
-        # We first remove the diagonal elements as we do not want to predict self-connections.
-        adj = sp.csr_matrix(adj - adj.diagonal())
-        adj.eliminate_zeros()
+        if(split_path and split_path.endswith(".npz")):
+            split_path = split_path[:-len(".npz")]
+        if(split_path and seed is not None):
+            split_path = split_path + "-" + str(seed)
+        if(split_path):
+            split_path = split_path + ".npz"
+
+        if(split_path and os.path.exists(split_path)):
+            print("Reading edge split from", str(split_path))
+            split = np.load(split_path)
+            edge_split = [split[name] for name in EDGE_SPLIT_NAMES]
+            validate_edge_split(edge_split, adj, split_path)
+        else:
+            edge_split = compute_edge_split(adj=adj, dataset_splits=dataset_splits, shuffle_data=shuffle_data, seed=seed)
+            if(split_path):
+                np.savez(split_path, **dict(zip(EDGE_SPLIT_NAMES, edge_split)))
 
-        # Since we assume the graph to be undirected, we do not need to keep the entire graph
-        adj_triangular = sp.triu(adj, k=0)
+        train_edges, validation_edges, test_edges, \
+        validation_edges_negative_sample, test_edges_negative_sample = edge_split
 
-        node_count = self.adj.shape[0]
-        edges_list = list(zip(adj_triangular.row, adj_triangular.col))
-        edges_set = set(edges_list)
-        edges = np.asarray(edges_list)
-        edges_count = int(edges.shape[0])
-        train_edges_count = int(edges_count * dataset_splits[0])
-        validation_edges_count = int(edges_count * dataset_splits[1])
-        test_edges_count = edges_count - train_edges_count - validation_edges_count
+        train_index = train_edges
+        val_index = np.concatenate((validation_edges, validation_edges_negative_sample))
+        test_index = np.concatenate((test_edges, test_edges_negative_sample))
 
-        edges_index = list(range(edges_count))
+        # We would pass along the adjacency matrix of train_index for the autoencoder loss
+        # We need to make sure that the new adjacency matrix is of the same dimension as the original one
+        adj_ae = get_edge_adj(train_index, shape=adj.shape)
 
-        if(shuffle_data):
-            np.random.shuffle(edges_index)
+        return adj_ae, train_index, val_index, test_index
 
-        train_edges_index = edges_index[:train_edges_count]
-        validation_edges_index = edges_index[train_edges_count:train_edges_count+validation_edges_count]
-        test_edges_index = edges_index[train_edges_count+validation_edges_count:]
+def validate_edge_split(edge_split, adj, split_path):
+    '''
+    Method to check that the `edge_split` read from `split_path` belongs to `adj`. Every array has to be a list of
+    (node, node) pairs within the nodes of `adj` and the positive edges have to be edges of `adj`.
+    '''
+    node_count = adj.shape[0]
+    for name, edges in zip(EDGE_SPLIT_NAMES, edge_split):
+        if (edges.ndim != 2 or edges.shape[1] != 2):
+            raise ValueError("{} in the edge split {} has the shape {} instead of (edges, 2)".format(
+                name, split_path, edges.shape))
+        if (edges.shape[0] > 0 and (edges.min() < 0 or edges.max() >= node_count)):
+            raise ValueError("{} in the edge split {} refers to nodes outside the graph of {} nodes".format(
+                name, split_path, node_count))
+
+    adj = sp.csr_matrix(adj)
+    # The first three arrays are the train, validation and test edges
+    for name, edges in list(zip(EDGE_SPLIT_NAMES, edge_split))[:3]:
+        if (edges.shape[0] > 0 and not np.all(np.asarray(adj[edges[:, 0], edges[:, 1]]).ravel() != 0)):
+            raise ValueError("{} in the edge split {} has edges which are not in the graph".format(name, split_path))
+
+
+def split_text_rows(lines, column_count=None, first_line_number=1):
+    '''
+    Method to split the text `lines` into rows of tokens, skipping the empty lines and the `#` comments like
+    np.genfromtxt. Every row is checked to have `column_count` columns, or as many columns as the first row if
+    `column_count` is None. `first_line_number` is the line number of lines[0], used in the error messages.
+    '''
+    rows = []
+    for line_number, line in enumerate(lines, first_line_number):
+        row = line.split("#", 1)[0].split()
+        if not row:
+            continue
+        if (column_count is None):
+            column_count = len(row)
+        assert (len(row) == column_count), "Expected {} columns but found {} on line {}".format(
+            column_count, len(row), line_number)
+        rows.append(row)
+    return rows
+
+
+def convert_features_to_memmap(feature_data_path, output_path, chunk_size=1024):
+    '''
+    Method to convert the features in `feature_data_path` to an on-disk matrix in the `output_path` directory.
+    The file is parsed in blocks of `chunk_size` rows so the dense nodes X features matrix is never held in memory.
+    The features are stored in the CSR format unless a dense matrix would take less space.
+    '''
+    data_path = os.path.join(output_path, "data.bin")
+    indices_path = os.path.join(output_path, "indices.bin")
+    indptr = [np.zeros(1, dtype=np.int64)]
+    nnz = 0
+    node_count = 0
+    feature_count = -1
+    line_number = 1
+
+    with open(feature_data_path) as feature_file, \
+            open(data_path, "wb") as data_file, \
+            open(indices_path, "wb") as indices_file:
+        while True:
+            lines = list(islice(feature_file, chunk_size))
+            if not lines:
+                break
+            # The first column is the node and the remaining columns are the features
+            rows = split_text_rows(lines, column_count=feature_count + 1 if feature_count >= 0 else None,
+                                   first_line_number=line_number)
+            line_number += len(lines)
+            if not rows:
+                continue
+            feature_count = len(rows[0]) - 1
+            values = np.asarray(rows).reshape(-1, feature_count + 1)[:, 1:].astype(np.float32)
+
+            row_index, col_index = np.nonzero(values)
+            values[row_index, col_index].tofile(data_file)
+            col_index.astype(np.int32).tofile(indices_file)
+            indptr.append(nnz + np.cumsum(np.bincount(row_index, minlength=values.shape[0])))
+
+            nnz += row_index.shape[0]
+            node_count += values.shape[0]
+
+    feature_count = max(feature_count, 0)
+    index_dtype = np.int32 if nnz < np.iinfo(np.int32).max else np.int64
+    indptr = np.concatenate(indptr).astype(index_dtype)
+
+    csr_size = nnz * (np.dtype(np.float32).itemsize + np.dtype(np.int32).itemsize) + indptr.nbytes
+    dense_size = node_count * feature_count * np.dtype(np.float32).itemsize
+
+    np.save(os.path.join(output_path, "indptr.npy"), indptr)
+    np.save(os.path.join(output_path, "shape.npy"), np.asarray([node_count, feature_count, nnz], dtype=np.int64))
+
+    if (dense_size < csr_size):
+        features = load_memmap_features(output_path)
+        dense_features = np.lib.format.open_memmap(os.path.join(output_path, "dense.npy"), mode="w+",
+                                                   dtype=np.float32, shape=(node_count, feature_count))
+        for start in range(0, node_count, chunk_size):
+            dense_features[start:start + chunk_size] = features[start:start + chunk_size].toarray()
+        dense_features.flush()
+        del features, dense_features
+        for path in [data_path, indices_path, os.path.join(output_path, "indptr.npy")]:
+            os.remove(path)
+
+
+def load_memmap_features(path):
+    '''Method to memory-map the features written by `convert_features_to_memmap`'''
+    node_count, feature_count, nnz = np.load(os.path.join(path, "shape.npy")).tolist()
+
+    dense_path = os.path.join(path, "dense.npy")
+    if (os.path.exists(dense_path)):
+        return np.load(dense_path, mmap_mode="r")
+
+    if (nnz == 0):
+        # np.memmap can not map empty files
+        data = np.zeros(0, dtype=np.float32)
+        indices = np.zeros(0, dtype=np.int32)
+    else:
+        data = np.memmap(os.path.join(path, "data.bin"), dtype=np.float32, mode="r", shape=(nnz,))
+        indices = np.memmap(os.path.join(path, "indices.bin"), dtype=np.int32, mode="r", shape=(nnz,))
+    indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+    return sp.csr_matrix((data, indices, indptr), shape=(node_count, feature_count), copy=False)
+
+
+def compute_edge_split(adj, dataset_splits, shuffle_data=True, seed=None):
+    '''
+    Method to split the edges of `adj` into train, validation and test edges and to sample the negative edges for
+    the validation and test sets. All the edges are kept as int64 arrays of (i, j) pairs with i < j.
+    If `seed` is set, the split is drawn from its own random state instead of the global one and the edges are always
+    shuffled, as otherwise every seed would give the same positive edges.
+    '''
 
-        train_edges = edges[train_edges_index]
-        validation_edges = edges[validation_edges_index]
-        test_edges = edges[test_edges_index]
+    dataset_splits_sum = sum(dataset_splits)
+    dataset_splits = list(map(lambda x: x / dataset_splits_sum, dataset_splits))
 
+    # Since we assume the graph to be undirected, we do not need to keep the entire graph.
+    # Using k=1 also removes the diagonal elements as we do not want to predict self-connections.
+    adj_triangular = sp.triu(adj, k=1, format="csr")
+    adj_triangular.eliminate_zeros()
+    adj_triangular = adj_triangular.tocoo()
 
-        edges_negative_sample = sample_negative_edges(required_edges_count=test_edges_count + validation_edges_count,
-                                                                 true_edges=edges_set,
-                                                      node_count=node_count)
+    node_count = adj.shape[0]
+    edges = np.stack((adj_triangular.row, adj_triangular.col), axis=1).astype(np.int64)
+    edges_count = int(edges.shape[0])
+    train_edges_count = int(edges_count * dataset_splits[0])
+    validation_edges_count = int(edges_count * dataset_splits[1])
+    test_edges_count = edges_count - train_edges_count - validation_edges_count
 
-        validation_edges_negative_sample = np.asarray(edges_negative_sample[:validation_edges_count])
+    random_state = np.random if seed is None else np.random.RandomState(seed)
+    if(shuffle_data or seed is not None):
+        edges = edges[random_state.permutation(edges_count)]
 
-        test_edges_negative_sample = np.asarray(edges_negative_sample[validation_edges_count:])
+    train_edges = edges[:train_edges_count]
+    validation_edges = edges[train_edges_count:train_edges_count+validation_edges_count]
+    test_edges = edges[train_edges_count+validation_edges_count:]
 
-        train_index = train_edges
-        val_index = np.concatenate((validation_edges, validation_edges_negative_sample))
-        test_index = np.concatenate((test_edges, test_edges_negative_sample))
+    edges_negative_sample = sample_negative_edges(required_edges_count=test_edges_count + validation_edges_count,
+                                                  true_edges=edges,
+                                                  node_count=node_count,
+                                                  seed=seed)
 
-        # We would pass along the adjacency matrix of train_index for the autoencoder loss
-        # We need to make sure that the new adjacency matrix is of the same dimension as the original one
+    validation_edges_negative_sample = edges_negative_sample[:validation_edges_count]
 
-        data = np.ones(train_index.shape[0])
-        adj_ae = sp.csr_matrix((data, (train_index[:, 0], train_index[:, 1])),
-                               shape=adj.shape)
-        # Since so far we considered the graph to be undirected, we need to add back the edges in
-        # the other direction as well
+    test_edges_negative_sample = edges_negative_sample[validation_edges_count:]
 
-        adj_ae = adj_ae + adj_ae.transpose()
+    return [train_edges, validation_edges, test_edges,
+            validation_edges_negative_sample, test_edges_negative_sample]
 
-        return adj_ae, train_index, val_index, test_index
+def get_edge_adj(edges, shape):
+    '''Method to build the symmetric adjacency matrix of `shape` from the array of undirected (i, j) `edges`'''
+    data = np.ones(edges.shape[0], dtype=np.float32)
+    adj = sp.csr_matrix((data, (edges[:, 0], edges[:, 1])), shape=shape)
+    # Since so far we considered the graph to be undirected, we need to add back the edges in
+    # the other direction as well
+    return adj + adj.transpose()
 
 def symmetic_adj(adj):
     '''
@@ -277,40 +611,126 @@ def transform_adj(adj, is_symmetric=True):
     '''
     Method to transform the  adjacency matrix as described in section 2 of https://arxiv.org/abs/1609.02907
     '''
-    adj = adj + sp.eye(adj.shape[0])
     # Adding self connections
+    return normalize_adj(adj, symmetric=is_symmetric, add_self_connections=True)
 
-    adj = renormalization_trick(adj, is_symmetric)
+def renormalization_trick(adj, symmetric=True):
+    return normalize_adj(adj, symmetric=symmetric)
 
+def normalize_adj(adj, symmetric=True, add_self_connections=False):
+    '''
+    Method to normalize the adjacency matrix as D^-0.5 . adj . D^-0.5 (symmetric) or D^-1 . adj (random walk).
+    The result is a float32 CSR matrix whose `data` array is scaled in place, so the only full allocation is the
+    copy of `adj` itself. Nodes with zero degree are left as zero rows.
+    '''
+    if (add_self_connections):
+        adj = add_self_loops(adj)
+    else:
+        adj = sp.csr_matrix(adj, dtype=np.float32, copy=True)
+
+    # dii = sum_j(aij)
+    degree = np.asarray(adj.sum(axis=1), dtype=np.float32).ravel()
+    with np.errstate(divide="ignore"):
+        # dii = dii ** -0.5 for the symmetric case
+        degree_inverse = np.power(degree, -0.5 if symmetric else -1.0)
+    degree_inverse[np.isinf(degree_inverse)] = 0.0
+
+    # Scaling the rows (and the columns for the symmetric case) of adj
+    adj.data *= np.repeat(degree_inverse, np.diff(adj.indptr))
+    if (symmetric):
+        adj.data *= degree_inverse[adj.indices]
     return adj
 
-def renormalization_trick(adj, symmetric=True):
-    if symmetric:
-        # dii = sum_j(aij)
-        # dii = dii ** -o.5
-        d = sp.diags(
-            np.power(np.asarray(adj.sum(1)), -0.5).flatten(),
-            offsets=0)
-        # dii . adj . dii
-        return adj.dot(d).transpose().dot(d).tocsr()
+def add_self_loops(adj):
+    '''
+    Method to return a float32 CSR copy of `adj` with 1 added to every diagonal entry.
+    The missing diagonal entries are inserted directly into the CSR arrays instead of adding a sparse identity.
+    '''
+    adj = sp.csr_matrix(adj)
+    if (not adj.has_sorted_indices):
+        adj = adj.sorted_indices()
+    node_count = adj.shape[0]
+    row_counts = np.diff(adj.indptr)
+    rows = np.repeat(np.arange(node_count, dtype=adj.indices.dtype), row_counts)
+
+    # For every row, the diagonal entry is (or would be) preceded by the entries with smaller column ids.
+    diagonal_offset = np.bincount(rows[adj.indices < rows], minlength=node_count)
+    is_missing = np.ones(node_count, dtype=bool)
+    is_missing[rows[adj.indices == rows]] = False
+    del rows
+
+    insert_at = (adj.indptr[:-1] + diagonal_offset)[is_missing]
+    missing_rows = np.flatnonzero(is_missing).astype(adj.indices.dtype)
+    indices = np.insert(adj.indices, insert_at, missing_rows)
+    data = np.insert(adj.data.astype(np.float32, copy=False), insert_at, 0.0)
+    indptr = adj.indptr + np.concatenate(([0], np.cumsum(is_missing)))
+
+    data[indptr[:-1] + diagonal_offset] += 1.0
+    return sp.csr_matrix((data, indices, indptr), shape=adj.shape)
 
 def get_identity(size):
     '''return indentity matrix of the given size'''
     return sp.eye(m=size)
 
-def compute_chebyshev_polynomial(adj, degree):
-    '''Method to compute Chebyshev Polynomial upto degree `degree`'''
+def compute_normalized_laplacian(adj):
+    '''Method to compute the normalized laplacian In - D^-0.5 . adj . D^-0.5'''
+    return get_identity(adj.shape[0]) - renormalization_trick(adj=adj)
 
-    adj_normalized = renormalization_trick(adj=adj)
+def estimate_lambda_max(laplacian, lambda_max_mode=ARPACK, v0=None, tol=1e-3, max_iter=100):
+    '''
+    Method to estimate the largest eigenvalue of the normalized `laplacian`.
+    Returns the eigenvalue along with the corresponding (approximate) eigenvector.
+    '''
+    if (lambda_max_mode not in (ARPACK, POWER_ITERATION, ANALYTIC)):
+        raise ValueError("Unsupported lambda_max_mode {}. Supported values are {}, {} and {}".format(
+            lambda_max_mode, ARPACK, POWER_ITERATION, ANALYTIC))
+
+    if (lambda_max_mode == ANALYTIC):
+        return 2.0, None
+
+    if (v0 is not None and v0.shape[0] != laplacian.shape[0]):
+        v0 = None
+
+    if (lambda_max_mode == POWER_ITERATION):
+        # The normalized laplacian is positive semi-definite so the dominant eigenvalue is lambda_max.
+        if (v0 is None):
+            v0 = np.random.RandomState(0).uniform(size=laplacian.shape[0])
+        eigenvector = v0 / np.linalg.norm(v0)
+        eigval = 0.0
+        for _ in range(max_iter):
+            product = laplacian.dot(eigenvector)
+            previous_eigval, eigval = eigval, float(eigenvector.dot(product))
+            eigenvector = product / np.linalg.norm(product)
+            if (abs(eigval - previous_eigval) <= tol * abs(eigval)):
+                break
+        # The Rayleigh quotient approaches lambda_max from below, which would leave the top of the spectrum of the
+        # scaled laplacian outside [-1, 1]. We add the residual norm as a margin and clamp the estimate to 2, the
+        # bound on the spectrum of the normalized laplacian.
+        residual = np.linalg.norm(laplacian.dot(eigenvector) - eigval * eigenvector)
+        return min(eigval + residual, 2.0), eigenvector
+
+    eigval, eigenvector = eigsh(A = laplacian, k = 1, which="LM", v0=v0)
+    return float(eigval[0]), eigenvector[:, 0]
+
+def compute_scaled_laplacian(adj, lambda_max=None):
+    '''Method to compute the scaled laplacian 2L/lambda_max - In which is the input of the Chebyshev recurrence'''
 
     identity_size  = adj.shape[0]
 
     # laplacian_normalized = In - adj_normalized
-    laplacian_normalized = get_identity(identity_size) - adj_normalized
-    eigval, _ = eigsh(A = laplacian_normalized, k = 1, which="LM")
+    laplacian_normalized = compute_normalized_laplacian(adj)
+    if (lambda_max is None):
+        lambda_max, _ = estimate_lambda_max(laplacian_normalized)
 
     # L = 2L/lamba_max - In
-    laplacian_normalized_scaled = (2.0 * laplacian_normalized)/eigval[0] - get_identity(identity_size)
+    return ((2.0 * laplacian_normalized)/lambda_max - get_identity(identity_size)).tocsr()
+
+def compute_chebyshev_polynomial(adj, degree, lambda_max=None):
+    '''Method to compute Chebyshev Polynomial upto degree `degree`'''
+
+    identity_size  = adj.shape[0]
+
+    laplacian_normalized_scaled = compute_scaled_laplacian(adj, lambda_max=lambda_max)
     Tk = [get_identity(identity_size), laplacian_normalized_scaled]
     # Tk = [Tk[-1] + Tk[-2]]
 
@@ -326,25 +746,154 @@ def _compute_chebyshev_recurrence(current, previous, X):
     next = 2 * X.dot(current) - previous
     return next
 
-def sample_negative_edges(required_edges_count, true_edges, node_count):
-    '''Method to sample negative edges'''
-    edges_negative_sample = set()
-    edges_negative_sample_count = 0
-    while edges_negative_sample_count < required_edges_count:
-        # randomly sample two nodes
-        i = np.random.randint(0, node_count)
-        j = np.random.randint(0, node_count)
-        to_insert = True
-        if (i == j):
-            # self-connection, so ignore
-            to_insert = False
-        elif (((i, j) in true_edges) or (j, i) in true_edges):
-            # True edge so ignore
-            to_insert = False
-        elif (((i, j) in edges_negative_sample) or ((j, i) in edges_negative_sample)):
-            # Already added so ignore
-            to_insert = False
-        if (to_insert):
-            edges_negative_sample.add((i, j))
-            edges_negative_sample_count += 1
-    return list(edges_negative_sample)
+def propagate_features(support, features, num_hops, concat_hops=False, out=None):
+    '''
+    Method to compute support^num_hops . features as a dense float32 matrix, as in https://arxiv.org/abs/1902.07153.
+    If `concat_hops` is set, the features for all the hops from 0 to num_hops are concatenated instead, as in
+    https://arxiv.org/abs/2004.11198. The result is written to `out` if it is given.
+    '''
+    width = features.shape[1]
+    if (out is None):
+        hops = num_hops + 1 if concat_hops else 1
+        out = np.empty((features.shape[0], hops * width), dtype=np.float32)
+
+    current = features
+    if (concat_hops):
+        out[:, :width] = current.toarray() if sp.issparse(current) else current
+    for hop in range(1, num_hops + 1):
+        current = support.dot(current)
+        if (sp.issparse(current)):
+            # The propagated features fill in quickly so they are kept dense
+            current = current.toarray()
+        current = np.asarray(current, dtype=np.float32)
+        if (concat_hops):
+            out[:, hop * width:(hop + 1) * width] = current
+    if (not concat_hops):
+        out[:] = current.toarray() if sp.issparse(current) else current
+    return out
+
+
+def partition_graph(adj, num_clusters, max_iter=20, imbalance=1.1, random_state=np.random):
+    '''
+    Method to partition the nodes of `adj` into `num_clusters` clusters using size constrained label propagation.
+    The nodes start in balanced random clusters. At every iteration, every node is scored against the clusters of its
+    neighbors and the nodes with a positive gain move to their best cluster, in the decreasing order of the gain, as
+    long as the cluster has fewer than imbalance * N / num_clusters nodes. Returns the cluster id of every node.
+    '''
+    adj = sp.csr_matrix(adj)
+    node_count = adj.shape[0]
+    nodes = np.arange(node_count)
+    partition = random_state.permutation(node_count) % num_clusters
+    capacity = int(np.ceil(imbalance * node_count / num_clusters))
+
+    for _ in range(max_iter):
+        membership = sp.csr_matrix((np.ones(node_count, dtype=np.float32), (nodes, partition)),
+                                   shape=(node_count, num_clusters))
+        scores = sp.csr_matrix(abs(adj).dot(membership))
+        best_cluster = np.asarray(scores.argmax(axis=1)).ravel()
+        gain = scores.max(axis=1).toarray().ravel() - np.asarray(scores[nodes, partition]).ravel()
+
+        candidates = np.nonzero((gain > 0) & (best_cluster != partition))[0]
+        if (candidates.shape[0] == 0):
+            break
+        candidates = candidates[np.argsort(-gain[candidates], kind="mergesort")]
+
+        # Rank of every candidate among the candidates moving to the same cluster, in the order of the gain
+        targets = best_cluster[candidates]
+        order = np.argsort(targets, kind="mergesort")
+        sorted_targets = targets[order]
+        group_start = np.searchsorted(sorted_targets, sorted_targets)
+        rank = np.empty(candidates.shape[0], dtype=np.int64)
+        rank[order] = np.arange(candidates.shape[0]) - group_start
+
+        room = capacity - np.bincount(partition, minlength=num_clusters)
+        accepted = rank < room[targets]
+        if (not np.any(accepted)):
+            break
+        partition[candidates[accepted]] = targets[accepted]
+
+    return partition
+
+
+def encode_edges(edges, node_count):
+    '''
+    Method to encode the (i, j) pairs in `edges` as int64 keys min(i, j) * node_count + max(i, j).
+    The direction of the edges is ignored so (i, j) and (j, i) have the same key.
+    '''
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    return np.minimum(edges[:, 0], edges[:, 1]) * node_count + np.maximum(edges[:, 0], edges[:, 1])
+
+def decode_edges(edge_keys, node_count):
+    '''Method to decode the int64 keys from `encode_edges` back to an array of (i, j) pairs'''
+    return np.stack((edge_keys // node_count, edge_keys % node_count), axis=1)
+
+def sample_negative_edges(required_edges_count, true_edges, node_count, seed=None, num_workers=1):
+    '''
+    Method to sample negative edges.
+    `true_edges` is an array of (i, j) pairs. Returns an array of `required_edges_count` (i, j) pairs, with i < j, that
+    are neither self-connections nor true edges, with no pair repeated. The pairs are drawn in vectorised blocks and the
+    draw is reproducible for a given `seed`. With `num_workers` > 1 the blocks are drawn by a pool of processes.
+    '''
+    true_edge_keys = np.unique(encode_edges(true_edges, node_count))
+    assert (required_edges_count <= node_count * (node_count - 1) // 2 - true_edge_keys.shape[0]), \
+        "Not enough negative edges in the graph"
+
+    if (seed is None):
+        # Derive the seed from the global random state so that np.random.seed still makes the runs reproducible
+        seed = np.random.randint(0, 2 ** 31 - 1)
+
+    if (num_workers > 1 and required_edges_count > num_workers):
+        worker_seeds = np.random.RandomState(seed).randint(0, 2 ** 31 - 1, size=num_workers)
+        worker_counts = np.diff(np.linspace(0, required_edges_count, num_workers + 1).astype(np.int64))
+        pool = Pool(processes=num_workers)
+        try:
+            worker_keys = pool.starmap(_sample_negative_edge_keys,
+                                       [(int(count), true_edge_keys, node_count, int(worker_seed))
+                                        for count, worker_seed in zip(worker_counts, worker_seeds)])
+        finally:
+            pool.close()
+            pool.join()
+        # The workers do not know about each other's samples so we remove the duplicates and top up
+        sampled_keys = _remove_duplicate_keys(np.concatenate(worker_keys))
+        sampled_keys = _sample_negative_edge_keys(required_edges_count - sampled_keys.shape[0], true_edge_keys,
+                                                  node_count, seed, sampled_keys=sampled_keys)
+    else:
+        sampled_keys = _sample_negative_edge_keys(required_edges_count, true_edge_keys, node_count, seed)
+
+    return decode_edges(sampled_keys, node_count)
+
+def _sample_negative_edge_keys(required_edges_count, true_edge_keys, node_count, seed, sampled_keys=None):
+    '''
+    Method to sample `required_edges_count` more negative edge keys in addition to `sampled_keys`.
+    `true_edge_keys` should be sorted. The keys are returned in the order in which they were drawn.
+    '''
+    random_state = np.random.RandomState(seed)
+    if (sampled_keys is None):
+        sampled_keys = np.zeros(0, dtype=np.int64)
+    target_count = sampled_keys.shape[0] + required_edges_count
+
+    while sampled_keys.shape[0] < target_count:
+        # Oversample so that most of the time one block is enough after the rejections
+        block_size = 2 * (target_count - sampled_keys.shape[0]) + 64
+        i = random_state.randint(0, node_count, size=block_size).astype(np.int64)
+        j = random_state.randint(0, node_count, size=block_size).astype(np.int64)
+
+        # self-connections are ignored
+        keep = i != j
+        keys = np.minimum(i[keep], j[keep]) * node_count + np.maximum(i[keep], j[keep])
+
+        # true edges are ignored
+        position = np.searchsorted(true_edge_keys, keys)
+        position[position == true_edge_keys.shape[0]] = 0
+        if (true_edge_keys.shape[0] > 0):
+            keys = keys[true_edge_keys[position] != keys]
+
+        # edges which are already sampled are ignored
+        sampled_keys = _remove_duplicate_keys(np.concatenate((sampled_keys, keys)))
+
+    return sampled_keys[:target_count]
+
+def _remove_duplicate_keys(keys):
+    '''Method to remove the duplicate keys while keeping the first occurrence of every key in place'''
+    _, first_index = np.unique(keys, return_index=True)
+    return keys[np.sort(first_index)]
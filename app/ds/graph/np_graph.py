@@ -1,46 +1,161 @@
+import os
+from itertools import islice
+
 import numpy as np
 from scipy import sparse as sp
 
 from app.ds.graph import base_graph
 from app.utils.constant import GCN
-from app.ds.graph.base_graph import symmetic_adj
+from app.ds.graph.base_graph import symmetic_adj, split_text_rows
 
 
 class Graph(base_graph.Base_Graph):
     '''Base class for the graph data structure'''
 
-    def __init__(self, model_name=GCN, sparse_features=True):
+    def __init__(self, model_name=GCN, sparse_features=True, cache_dir=None, mmap_features=False):
         '''Method to initialise the graph'''
-        super(Graph, self).__init__(model_name=model_name, sparse_features=sparse_features)
+        super(Graph, self).__init__(model_name=model_name, sparse_features=sparse_features, cache_dir=cache_dir,
+                                    mmap_features=mmap_features)
 
-    def read_network(self, network_data_path):
+    def read_network(self, network_data_path, chunk_size=1 << 20):
         '''
-        Method to read the network from `network_data_path`
+        Method to read the network from `network_data_path`.
+        The edge list is streamed in blocks of `chunk_size` lines so that the whole file never has to be held in memory
+        as strings. Self-loops and duplicate edges are dropped while streaming. Empty lines and `#` comments are skipped
+        and every line is checked to have as many columns as the first one before its block is used.
         '''
 
         node_count = self.features.shape[0]
-        edges = np.genfromtxt(network_data_path, dtype=np.dtype(str))
-        # I guess the code would break for the case when we have just 1 edge. I should be fixing that later
-
-        if (edges.shape[1] == 2):
-            #     unwieghted graph
-            edges = np.array(list(map(self.node_to_id_map.get, edges.flatten())),
-                             dtype=np.int32).reshape(edges.shape)
-            adj = sp.coo_matrix((np.ones(edges.shape[0]), (edges[:, 0], edges[:, 1])),
-                                shape=(node_count, node_count), dtype=np.float32)
-        else:
+        node_lookup = build_node_lookup(self.node_to_id_map)
+        edge_buffer = None
+        column_count = None
+        line_number = 1
+
+        with open(network_data_path) as network_file:
+            while True:
+                lines = list(islice(network_file, chunk_size))
+                if not lines:
+                    break
+                rows = split_text_rows(lines, column_count=column_count, first_line_number=line_number)
+                line_number += len(lines)
+                if not rows:
+                    continue
+                if edge_buffer is None:
+                    # The first non-empty line decides if the graph is weighted (3 columns) or unweighted (2 columns)
+                    column_count = len(rows[0])
+                    assert (column_count in (2, 3)), "Expected 2 or 3 columns in the network file"
+                    average_line_size = float(sum(map(len, lines))) / len(lines)
+                    edge_buffer = EdgeBuffer(
+                        node_count=node_count,
+                        capacity=int(os.path.getsize(network_data_path) / average_line_size) + 1,
+                        weighted=(column_count == 3))
 
-            # weighted graph
-            edges = np.array(list(map(
-                lambda _edge_data: (self.node_to_id_map[_edge_data[0]],
-                                    self.node_to_id_map[_edge_data[1]],
-                                    float(_edge_data[2])),
-                edges)), dtype=np.int32).reshape(edges.shape)
-            adj = sp.coo_matrix((edges[:, 2], (edges[:, 0], edges[:, 1])),
-                                shape=(node_count, node_count), dtype=np.float32)
+                tokens = np.asarray(rows).reshape(-1, column_count)
+                rows = map_nodes_to_ids(tokens[:, 0], node_lookup)
+                cols = map_nodes_to_ids(tokens[:, 1], node_lookup)
+                weights = None
+                if edge_buffer.weighted:
+                    weights = tokens[:, 2].astype(np.float32)
+                edge_buffer.append(rows, cols, weights)
+
+        if edge_buffer is None:
+            edge_buffer = EdgeBuffer(node_count=node_count, capacity=0)
+        rows, cols, weights = edge_buffer.get_edges()
+
+        adj = sp.coo_matrix((weights, (rows, cols)),
+                            shape=(node_count, node_count), dtype=np.float32)
 
         self.adj = symmetic_adj(adj)
-        self.edge_count = edges.shape[0]
+        self.edge_count = rows.shape[0]
         print("{} edges read.".format(self.edge_count))
 
-        return adj
\ No newline at end of file
+        return adj
+
+
+class EdgeBuffer():
+    '''Preallocated int32 COO buffer which drops self-loops and duplicate edges as the edges are appended'''
+
+    def __init__(self, node_count, capacity, weighted=False):
+        self.node_count = node_count
+        self.weighted = weighted
+        self.size = 0
+        capacity = max(capacity, 1)
+        self.rows = np.empty(capacity, dtype=np.int32)
+        self.cols = np.empty(capacity, dtype=np.int32)
+        self.weights = np.empty(capacity, dtype=np.float32) if weighted else None
+
+    def append(self, rows, cols, weights=None):
+        '''Method to append a block of edges to the buffer'''
+        keep = rows != cols
+        rows, cols = rows[keep], cols[keep]
+        if self.weighted:
+            weights = weights[keep]
+
+        # Duplicates within the block are removed before they are copied in
+        _, unique_index = np.unique(self._edge_keys(rows, cols), return_index=True)
+        rows, cols = rows[unique_index], cols[unique_index]
+        if self.weighted:
+            weights = weights[unique_index]
+
+        block_size = rows.shape[0]
+        if self.size + block_size > self.rows.shape[0]:
+            # Removing the duplicates across the blocks seen so far is cheaper than growing the buffer
+            self._compact()
+        if self.size + block_size > self.rows.shape[0]:
+            self._resize(max(2 * self.rows.shape[0], self.size + block_size))
+
+        self.rows[self.size:self.size + block_size] = rows
+        self.cols[self.size:self.size + block_size] = cols
+        if self.weighted:
+            self.weights[self.size:self.size + block_size] = weights
+        self.size += block_size
+
+    def get_edges(self):
+        '''Method to return the deduplicated (rows, cols, weights) arrays'''
+        self._compact()
+        rows = self.rows[:self.size]
+        cols = self.cols[:self.size]
+        if self.weighted:
+            weights = self.weights[:self.size]
+        else:
+            weights = np.ones(self.size, dtype=np.float32)
+        return rows, cols, weights
+
+    def _edge_keys(self, rows, cols):
+        '''Method to encode the (row, col) pairs as int64 keys'''
+        return rows.astype(np.int64) * self.node_count + cols
+
+    def _compact(self):
+        '''Method to remove the duplicate edges from the buffer, keeping the first occurrence of every edge'''
+        _, unique_index = np.unique(self._edge_keys(self.rows[:self.size], self.cols[:self.size]),
+                                    return_index=True)
+        size = unique_index.shape[0]
+        self.rows[:size] = self.rows[unique_index]
+        self.cols[:size] = self.cols[unique_index]
+        if self.weighted:
+            self.weights[:size] = self.weights[unique_index]
+        self.size = size
+
+    def _resize(self, capacity):
+        '''Method to grow the buffer to `capacity` edges'''
+        self.rows = np.resize(self.rows, capacity)
+        self.cols = np.resize(self.cols, capacity)
+        if self.weighted:
+            self.weights = np.resize(self.weights, capacity)
+
+
+def build_node_lookup(node_to_id_map):
+    '''Method to build a sorted (names, ids) lookup so that node names can be mapped to ids in bulk'''
+    names = np.asarray(list(node_to_id_map.keys()))
+    ids = np.asarray(list(node_to_id_map.values()), dtype=np.int32)
+    order = np.argsort(names)
+    return names[order], ids[order]
+
+
+def map_nodes_to_ids(nodes, node_lookup):
+    '''Method to map an array of node names to their ids using the lookup from `build_node_lookup`'''
+    names, ids = node_lookup
+    position = np.searchsorted(names, nodes)
+    position[position == names.shape[0]] = 0
+    assert (names.shape[0] > 0 and np.all(names[position] == nodes)), "Some nodes in the network are missing ids"
+    return ids[position]
@@ -1,19 +1,22 @@
 import pickle as pkl
 import sys
+from itertools import chain
 
-import networkx as nx
 import numpy as np
 from scipy import sparse as sp
 
 from app.ds.graph import base_graph
+from app.utils.cache import fingerprint_files, get_cache_path, is_valid_cache, save_arrays, load_arrays
 from app.utils.constant import GCN
 
 class Graph(base_graph.Base_Graph):
     '''This is the class to access the preprocessed graphs'''
 
-    def __init__(self, model_name=GCN, sparse_features=True):
-        '''Method to initialise the graph'''
-        super(Graph, self).__init__(model_name=model_name, sparse_features=sparse_features)
+    def __init__(self, model_name=GCN, sparse_features=True, cache_dir=None, mmap_features=False):
+        '''Method to initialise the graph.
+        The features are read from the pickled files so `mmap_features` only applies to the text based graphs.'''
+        super(Graph, self).__init__(model_name=model_name, sparse_features=sparse_features, cache_dir=cache_dir,
+                                    mmap_features=mmap_features)
         self.preprocessed = True
 
     def read_data(self, data_dir=None, dataset_name=None):
@@ -24,6 +27,17 @@ class Graph(base_graph.Base_Graph):
         '''
         print("Reading data from", str(data_dir))
         names = ['x', 'y', 'tx', 'ty', 'allx', 'ally', 'graph']
+
+        cache_path = None
+        if (self.cache_dir):
+            fingerprint = fingerprint_files(
+                ["{}/{}/ind.{}.{}".format(data_dir, dataset_name, dataset_name, name)
+                 for name in names + ['test.index']])
+            cache_path = get_cache_path(self.cache_dir, dataset_name, fingerprint)
+            if (is_valid_cache(cache_path)):
+                print("Reading cached data from", str(cache_path))
+                return self._load_cache(cache_path)
+
         objects = []
         for i in range(len(names)):
             with open("{}/{}/ind.{}.{}".format(data_dir, dataset_name, dataset_name, names[i]), 'rb') as f:
@@ -40,20 +54,25 @@ class Graph(base_graph.Base_Graph):
             # Fix citeseer dataset (there are some isolated nodes in the graph)
             # Find isolated nodes, add them as zero-vecs into the right position
             test_idx_range_full = range(min(test_idx_reorder), max(test_idx_reorder) + 1)
-            tx_extended = sp.lil_matrix((len(test_idx_range_full), x.shape[1]))
-            tx_extended[test_idx_range - min(test_idx_range), :] = tx
+            tx = tx.tocoo()
+            tx_extended = sp.csr_matrix((tx.data, (test_idx_range[tx.row] - min(test_idx_range), tx.col)),
+                                        shape=(len(test_idx_range_full), x.shape[1]))
             tx = tx_extended
             ty_extended = np.zeros((len(test_idx_range_full), y.shape[1]))
             ty_extended[test_idx_range - min(test_idx_range), :] = ty
             ty = ty_extended
 
-        # features = sp.vstack((allx, tx)).tocsr()
-        features = sp.vstack((allx, tx)).tolil()
-        features[test_idx_reorder, :] = features[test_idx_range, :]
-        adj = nx.adjacency_matrix(nx.from_dict_of_lists(graph))
+        features = sp.vstack((allx, tx)).tocsr()
+
+        # The test nodes are stored in a different order than their ids. Moving row `test_idx_range[i]` to
+        # `test_idx_reorder[i]` is a single row permutation of the features and the labels.
+        node_permutation = np.arange(features.shape[0])
+        node_permutation[test_idx_reorder] = test_idx_range
+        features = features[node_permutation]
+
+        adj = convert_dict_of_lists_to_csr(graph)
 
-        labels = np.vstack((ally, ty))
-        labels[test_idx_reorder, :] = labels[test_idx_range, :]
+        labels = np.vstack((ally, ty))[node_permutation]
 
         idx_test = test_idx_range.tolist()
         idx_train = range(len(y))
@@ -63,8 +82,28 @@ class Graph(base_graph.Base_Graph):
         self.features = features
         self.labels = labels
 
+        if (cache_path):
+            save_arrays(cache_path, {
+                "adj": sp.csr_matrix(adj),
+                "features": sp.csr_matrix(features),
+                "labels": labels,
+                "idx_train": np.asarray(idx_train),
+                "idx_val": np.asarray(idx_val),
+                "idx_test": np.asarray(idx_test)
+            })
+
         return idx_train, idx_val, idx_test
 
+    def _load_cache(self, cache_path):
+        '''Method to populate the graph from the binary cache at `cache_path` and return the dataset splits'''
+        arrays = load_arrays(cache_path, ["adj", "features", "labels", "idx_train", "idx_val", "idx_test"])
+
+        self.adj = arrays["adj"]
+        self.features = arrays["features"]
+        self.labels = arrays["labels"]
+
+        return arrays["idx_train"], arrays["idx_val"], arrays["idx_test"]
+
     def read_network(self, network_data_path):
         '''
         Method to read the network from `network_data_path`
@@ -78,3 +117,24 @@ def parse_index_file(filename):
     for line in open(filename):
         index.append(int(line.strip()))
     return index
+
+
+def convert_dict_of_lists_to_csr(graph, node_count=None):
+    '''
+    Method to convert the adjacency list `graph`, a dict mapping every node id to a list of its neighbours, to a
+    symmetric CSR adjacency matrix. For nodes numbered 0..n-1, this is the same as
+    `networkx.adjacency_matrix(networkx.from_dict_of_lists(graph))` without building the networkx graph.
+    '''
+    neighbour_counts = np.fromiter(map(len, graph.values()), dtype=np.int64, count=len(graph))
+    rows = np.repeat(np.fromiter(graph.keys(), dtype=np.int64, count=len(graph)), neighbour_counts)
+    cols = np.fromiter(chain.from_iterable(graph.values()), dtype=np.int64, count=rows.shape[0])
+
+    if (node_count is None):
+        node_count = int(np.concatenate((rows, cols, [-1])).max()) + 1
+
+    # The graph is undirected so every edge is added in both directions before removing the duplicates
+    edge_keys = np.unique(np.concatenate((rows * node_count + cols, cols * node_count + rows)))
+
+    return sp.csr_matrix((np.ones(edge_keys.shape[0], dtype=np.float32),
+                          (edge_keys // node_count, edge_keys % node_count)),
+                         shape=(node_count, node_count))
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class HistoricalEmbeddingStore():
+    '''
+    Class for keeping the latest activations of every node for the hidden layers of a model, in the spirit of
+    GNNAutoScale. Every layer has a preallocated N X hidden float32 array which can be memory-mapped from a file in
+    `mmap_dir`. The mini-batches read the (possibly stale) activations of their out of batch neighbors from the store
+    and write back the activations of their own nodes. The files are kept in a directory of their own which is removed
+    by `release`.
+    '''
+
+    def __init__(self, node_count, sizes, mmap_dir=None):
+        self.node_count = node_count
+        self.sizes = sizes
+        self.embeddings = []
+        self.mmap_dir = None
+        if (mmap_dir):
+            if not os.path.exists(mmap_dir):
+                os.makedirs(mmap_dir)
+            self.mmap_dir = tempfile.mkdtemp(prefix="history-", dir=mmap_dir)
+        for layer, size in enumerate(sizes):
+            if (self.mmap_dir):
+                # A new .npy file is zero filled without writing the zeros
+                self.embeddings.append(np.lib.format.open_memmap(
+                    os.path.join(self.mmap_dir, "layer" + str(layer) + ".npy"), mode="w+", dtype=np.float32,
+                    shape=(node_count, size)))
+            else:
+                self.embeddings.append(np.zeros((node_count, size), dtype=np.float32))
+
+    def pull(self, layer, nodes):
+        '''Method to read the activations of `nodes` for the hidden `layer`'''
+        return self.embeddings[layer][nodes]
+
+    def push(self, layer, nodes, values):
+        '''Method to write the activations `values` of `nodes` for the hidden `layer`'''
+        self.embeddings[layer][nodes] = values
+
+    def release(self):
+        '''Method to drop the historical embeddings along with their memory-mapped files, if any'''
+        self.embeddings = []
+        if (self.mmap_dir):
+            shutil.rmtree(self.mmap_dir, ignore_errors=True)
+            self.mmap_dir = None
@@ -0,0 +1,224 @@
+import threading
+from queue import Queue, Empty, Full
+
+import numpy as np
+from scipy import sparse as sp
+
+
+class NeighborSampler():
+    '''
+    Class for sampling the per-layer blocks of the supports for mini-batches of seed nodes.
+    All the supports are sampled on the union of their sparsity patterns so that the blocks for the different supports
+    of a layer share the same nodes.
+    '''
+
+    def __init__(self, supports):
+        supports = [sp.csr_matrix(support) for support in supports]
+        for support in supports:
+            support.sum_duplicates()
+            support.sort_indices()
+        pattern = abs(supports[0])
+        for support in supports[1:]:
+            pattern = pattern + abs(support)
+        pattern = sp.csr_matrix(pattern)
+        pattern.sort_indices()
+
+        self.node_count = pattern.shape[0]
+        self.indptr = pattern.indptr.astype(np.int64)
+        self.indices = pattern.indices
+        self.degrees = np.diff(self.indptr)
+        # Values of every support lined up with self.indices, with zeros where a support has no entry
+        self.values = [self._align_values(support) for support in supports]
+
+    def _align_values(self, support):
+        '''Method to return the values of `support` for every entry of the union pattern'''
+        pattern_keys = self._edge_keys(self.indptr, self.indices)
+        support_keys = self._edge_keys(support.indptr.astype(np.int64), support.indices)
+        values = np.zeros(pattern_keys.shape[0], dtype=np.float32)
+        if (support_keys.shape[0] > 0):
+            position = np.searchsorted(support_keys, pattern_keys)
+            position[position == support_keys.shape[0]] = 0
+            found = support_keys[position] == pattern_keys
+            values[found] = support.data[position[found]]
+        return values
+
+    def _edge_keys(self, indptr, indices):
+        '''Method to encode the entries of a CSR structure as sorted int64 keys'''
+        rows = np.repeat(np.arange(indptr.shape[0] - 1, dtype=np.int64), np.diff(indptr))
+        return rows * self.node_count + indices
+
+    def _sample_entries(self, nodes, fanout, random_state):
+        '''
+        Method to sample `fanout` entries per row for the rows `nodes` of the union pattern.
+        Rows with at most `fanout` entries (or all the rows if `fanout` <= 0) keep all their entries. The other rows draw
+        `fanout` entries with replacement and scale them by degree / fanout so that the sampled product is an unbiased
+        estimate of the full one.
+        Returns the position of every sampled entry in `nodes`, its position in the pattern and its scale.
+        '''
+        degrees = self.degrees[nodes]
+        full = degrees <= fanout if fanout > 0 else np.ones(nodes.shape[0], dtype=bool)
+
+        full_rows = np.nonzero(full)[0]
+        counts = degrees[full_rows]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        full_positions = np.repeat(self.indptr[nodes[full_rows]], counts) + offsets
+        full_rows = np.repeat(full_rows, counts)
+
+        sampled_rows = np.nonzero(~full)[0]
+        sampled_degrees = np.repeat(degrees[sampled_rows], fanout)
+        sampled_positions = np.repeat(self.indptr[nodes[sampled_rows]], fanout) + \
+                            (random_state.random_sample(sampled_degrees.shape[0]) * sampled_degrees).astype(np.int64)
+        sampled_rows = np.repeat(sampled_rows, fanout)
+
+        rows = np.concatenate((full_rows, sampled_rows))
+        positions = np.concatenate((full_positions, sampled_positions))
+        scales = np.concatenate((np.ones(full_positions.shape[0], dtype=np.float32),
+                                 sampled_degrees.astype(np.float32) / max(fanout, 1)))
+        return rows, positions, scales
+
+    def sample(self, seeds, fanouts, random_state=np.random):
+        '''
+        Method to sample the blocks for the mini-batch of `seeds`, with fanouts[l] neighbors per node for the layer l.
+        Returns the input nodes of the first layer and, for every layer, the list of blocks (one per support) of shape
+        (output nodes of the layer X input nodes of the layer). The output nodes of the last layer are the seeds.
+        '''
+        nodes = np.asarray(seeds, dtype=np.int64)
+        blocks = []
+        for fanout in reversed(fanouts):
+            rows, positions, scales = self._sample_entries(nodes, fanout, random_state)
+            input_nodes, cols = np.unique(self.indices[positions], return_inverse=True)
+            # Entries drawn more than once are summed up by the CSR constructor
+            blocks.insert(0, [sp.csr_matrix((values[positions] * scales, (rows, cols)),
+                                            shape=(nodes.shape[0], input_nodes.shape[0]), dtype=np.float32)
+                              for values in self.values])
+            nodes = input_nodes
+        return nodes, blocks
+
+    def sample_halo(self, nodes):
+        '''
+        Method to return the out of batch neighbors (the halo) of `nodes` along with the blocks (one per support) of
+        the full rows of `nodes`, of shape (nodes X (nodes + halo)). The columns of `nodes` come first, in their order,
+        followed by the columns of the halo.
+        '''
+        nodes = np.asarray(nodes, dtype=np.int64)
+        rows, positions, _ = self._sample_entries(nodes, 0, np.random)
+        neighbors = self.indices[positions]
+
+        order = np.argsort(nodes)
+        sorted_nodes = nodes[order]
+        position = np.searchsorted(sorted_nodes, neighbors)
+        position[position == sorted_nodes.shape[0]] = 0
+        in_batch = sorted_nodes[position] == neighbors
+
+        halo, halo_cols = np.unique(neighbors[~in_batch], return_inverse=True)
+        cols = np.empty(neighbors.shape[0], dtype=np.int64)
+        cols[in_batch] = order[position[in_batch]]
+        cols[~in_batch] = nodes.shape[0] + halo_cols
+        blocks = [sp.csr_matrix((values[positions], (rows, cols)),
+                                shape=(nodes.shape[0], nodes.shape[0] + halo.shape[0]), dtype=np.float32)
+                  for values in self.values]
+        return halo, blocks
+
+
+class ClusterSampler():
+    '''
+    Class for sampling Cluster-GCN style mini-batches. The graph is partitioned once into clusters and every mini-batch
+    is the subgraph induced by a few random clusters, with its own supports computed from the induced adjacency
+    matrix by `compute_supports(adj, cache)`. The supports of the single clusters are kept in memory, at most one set
+    per cluster, and are asked to be cached on disk as well.
+    '''
+
+    def __init__(self, graph, model_params, compute_supports):
+        self.graph = graph
+        self.model_params = model_params
+        self.compute_supports = compute_supports
+        partition = graph.compute_partition(num_clusters=model_params.num_clusters)
+        order = np.argsort(partition, kind="mergesort")
+        counts = np.bincount(partition, minlength=model_params.num_clusters)
+        self.cluster_nodes = np.split(order, np.cumsum(counts)[:-1])
+        self.cluster_supports = {}
+        # The supports of the single clusters are filled in by the threads which prepare the mini-batches
+        self.cluster_supports_lock = threading.Lock()
+
+    def get_batches(self, clusters_per_batch, random_state=np.random):
+        '''Method to split a random permutation of the non empty clusters into groups of `clusters_per_batch`'''
+        clusters = np.asarray([cluster for cluster, nodes in enumerate(self.cluster_nodes) if nodes.shape[0] > 0])
+        clusters = clusters[random_state.permutation(clusters.shape[0])]
+        return [clusters[start:start + clusters_per_batch] for start in range(0, clusters.shape[0], clusters_per_batch)]
+
+    def _compute_supports(self, nodes, cache):
+        '''Method to compute the supports of the subgraph induced by `nodes`'''
+        return self.compute_supports(self.graph.adj[nodes][:, nodes], cache)
+
+    def sample(self, clusters):
+        '''Method to return the (sorted) nodes in `clusters` along with the supports of the subgraph they induce'''
+        if (len(clusters) == 1):
+            cluster = int(clusters[0])
+            with self.cluster_supports_lock:
+                supports = self.cluster_supports.get(cluster)
+            if (supports is None):
+                # The supports are computed outside the lock so that the other threads are not held up
+                supports = self._compute_supports(self.cluster_nodes[cluster], cache=True)
+                with self.cluster_supports_lock:
+                    supports = self.cluster_supports.setdefault(cluster, supports)
+            return self.cluster_nodes[cluster], supports
+
+        # Combinations of clusters are rarely seen twice so their supports are not cached
+        nodes = np.sort(np.concatenate([self.cluster_nodes[cluster] for cluster in clusters]))
+        return nodes, self._compute_supports(nodes, cache=False)
+
+
+def prefetch(fn, jobs, num_workers=1, prefetch_size=1):
+    '''
+    Method to iterate over fn(job) for all the `jobs`, computed in `num_workers` background threads.
+    At most `prefetch_size` results are kept ready. The results are yielded in the order in which they are ready. If the
+    iteration stops early (or raises), the workers are stopped and the results they have queued are dropped.
+    '''
+    job_queue = Queue()
+    for job in jobs:
+        job_queue.put(job)
+    result_queue = Queue(maxsize=max(prefetch_size, 1))
+    stop = threading.Event()
+
+    def _put(result):
+        # The workers do not block on a full queue for good, so that they notice when the iteration stops
+        while (not stop.is_set()):
+            try:
+                result_queue.put(result, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def _work():
+        while (not stop.is_set()):
+            try:
+                job = job_queue.get_nowait()
+            except Empty:
+                return
+            try:
+                _put((True, fn(job)))
+            except Exception as exception:
+                _put((False, exception))
+
+    workers = []
+    for _ in range(max(min(num_workers, len(jobs)), 1)):
+        worker = threading.Thread(target=_work)
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    try:
+        for _ in range(len(jobs)):
+            success, result = result_queue.get()
+            if (not success):
+                raise result
+            yield result
+    finally:
+        stop.set()
+        for worker in workers:
+            while (worker.is_alive()):
+                try:
+                    result_queue.get_nowait()
+                except Empty:
+                    pass
+                worker.join(timeout=0.1)
@@ -0,0 +1,97 @@
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from app.ds.graph.base_graph import compute_edge_split, get_edge_adj, EDGE_SPLIT_NAMES
+from app.ds.graph.preprocessed_graph import Graph
+from app.utils.cache import fingerprint_sparse_matrix, get_cache_path, is_valid_cache, save_arrays, load_arrays, \
+    split_csr, join_csr, get_csr_names
+from app.utils.constant import SUPPORTS
+
+
+class EdgeSplitStore():
+    '''
+    Class for precomputing the edge splits of a graph for a list of seeds and caching them on disk.
+    For every seed, the store keeps the train, validation and test edges, the negative samples, the training adjacency
+    matrix and its supports. The splits which are missing are computed in parallel, one process per seed, and the
+    cached splits are memory-mapped when they are read.
+    '''
+
+    def __init__(self, adj, model_params, dataset_splits, seeds):
+        self.adj = adj
+        self.model_params = model_params
+        self.dataset_splits = dataset_splits
+        self.seeds = list(seeds)
+        # The edges are always shuffled by the seeds
+        self.fingerprint = fingerprint_sparse_matrix(adj, extra=[dataset_splits,
+                                                                 True,
+                                                                 model_params.model_name,
+                                                                 model_params.norm_mode,
+                                                                 model_params.support_size - 1,
+                                                                 model_params.lazy_chebyshev,
+                                                                 model_params.lambda_max_mode])
+
+    def get_split_path(self, seed):
+        '''Method to return the cache path for the split corresponding to `seed`'''
+        return get_cache_path(self.model_params.cache_dir, "edge_split", self.fingerprint + "-" + str(seed))
+
+    def populate(self):
+        '''Method to compute and cache the splits for all the seeds which are not cached yet'''
+        missing_seeds = [seed for seed in self.seeds if not is_valid_cache(self.get_split_path(seed))]
+        if not missing_seeds:
+            return
+        print("Computing edge splits for seeds", missing_seeds)
+        arguments = [(self.adj, self.model_params, self.dataset_splits, seed,
+                      self.get_split_path(seed)) for seed in missing_seeds]
+        if len(missing_seeds) == 1:
+            _compute_and_save_split(*arguments[0])
+        else:
+            pool = Pool(processes=min(len(missing_seeds), os.cpu_count() or 1))
+            try:
+                pool.starmap(_compute_and_save_split, arguments)
+            finally:
+                pool.close()
+                pool.join()
+
+    def get_split(self, seed):
+        '''
+        Method to return the split for `seed` as (adj, train_index, val_index, test_index, supports).
+        All the arrays are memory-mapped from the cache.
+        '''
+        if seed not in self.seeds:
+            self.seeds.append(seed)
+        self.populate()
+
+        cache_path = self.get_split_path(seed)
+        print("Reading edge split from", str(cache_path))
+        support_names = [SUPPORTS + str(i) for i in range(self.model_params.num_supports)]
+        names = list(EDGE_SPLIT_NAMES) + get_csr_names("adj")
+        for name in support_names:
+            names += get_csr_names(name)
+        arrays = load_arrays(cache_path, names, mmap_mode="r")
+
+        train_edges, validation_edges, test_edges, \
+        validation_edges_negative_sample, test_edges_negative_sample = [arrays[name] for name in EDGE_SPLIT_NAMES]
+
+        train_index = train_edges
+        val_index = np.concatenate((validation_edges, validation_edges_negative_sample))
+        test_index = np.concatenate((test_edges, test_edges_negative_sample))
+        supports = [join_csr(name, arrays) for name in support_names]
+
+        return join_csr("adj", arrays), train_index, val_index, test_index, supports
+
+
+def _compute_and_save_split(adj, model_params, dataset_splits, seed, cache_path):
+    '''Method to compute the split for `seed` along with its supports and save them at `cache_path`'''
+    edge_split = compute_edge_split(adj=adj, dataset_splits=dataset_splits, shuffle_data=True, seed=seed)
+    adj_ae = get_edge_adj(edge_split[0], shape=adj.shape)
+
+    # A graph without a cache_dir is enough to compute the supports of adj_ae
+    supports = Graph(model_name=model_params.model_name).compute_supports(model_params=model_params, adj=adj_ae)
+
+    arrays = dict(zip(EDGE_SPLIT_NAMES, edge_split))
+    arrays.update(split_csr("adj", adj_ae))
+    for i, support in enumerate(supports):
+        arrays.update(split_csr(SUPPORTS + str(i), support))
+    save_arrays(cache_path, arrays)
@@ -0,0 +1,89 @@
+'''
+Collection of functions to test the data structures
+'''
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.ds.graph.base_graph import compute_edge_split
+from app.ds.graph.np_graph import Graph
+from app.ds.split_store import EdgeSplitStore
+from app.utils.constant import GCN_AE, SYMMETRIC, ARPACK
+
+
+class _ModelParams():
+    '''Minimal model params for computing the supports of the gcn_ae model'''
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.model_name = GCN_AE
+        self.norm_mode = SYMMETRIC
+        self.support_size = 1
+        self.num_supports = 1
+        self.lazy_chebyshev = False
+        self.lambda_max_mode = ARPACK
+
+
+def _get_adj(node_count=100, density=0.1):
+    '''Method to return the adjacency matrix of a random undirected graph'''
+    adj = sp.random(node_count, node_count, density=density, format="csr", random_state=np.random.RandomState(42))
+    adj = ((adj + adj.T) > 0).astype(np.float32)
+    return sp.csr_matrix(adj)
+
+
+def _test_seeded_edge_splits():
+    '''
+    Method to test that different seeds give different positive edge splits, both with compute_edge_split and with
+    the EdgeSplitStore as DataPipelineAE uses it, and that a seed always gives the same split
+    '''
+
+    adj = _get_adj()
+    dataset_splits = [85, 5, 10]
+
+    split1 = compute_edge_split(adj=adj, dataset_splits=dataset_splits, shuffle_data=False, seed=1)
+    split2 = compute_edge_split(adj=adj, dataset_splits=dataset_splits, shuffle_data=False, seed=2)
+    assert not np.array_equal(split1[0], split2[0]), "Different seeds should give different train edges."
+
+    split = compute_edge_split(adj=adj, dataset_splits=dataset_splits, shuffle_data=False, seed=1)
+    assert all(np.array_equal(x, y) for x, y in zip(split, split1)), "A seed should always give the same split."
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        store = EdgeSplitStore(adj=adj, model_params=_ModelParams(cache_dir), dataset_splits=dataset_splits,
+                               seeds=[1, 2])
+        adj1, train_index1, _, _, _ = store.get_split(1)
+        adj2, train_index2, _, _, _ = store.get_split(2)
+        assert not np.array_equal(train_index1, train_index2), "Different seeds should give different train edges."
+        assert (adj1 != adj2).nnz > 0, "Different seeds should give different training adjacency matrices."
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _test_seeded_split_files():
+    '''Method to test that every seed keeps its own split file when the edge_split_path is shared by the seeds'''
+
+    graph = Graph(model_name=GCN_AE)
+    graph.adj = _get_adj()
+    dataset_splits = [85, 5, 10]
+
+    split_dir = tempfile.mkdtemp()
+    try:
+        split_path = os.path.join(split_dir, "split.npz")
+        _, train_index1, _, _ = graph.get_edge_mask(dataset_splits, split_path=split_path, seed=1)
+        _, train_index2, _, _ = graph.get_edge_mask(dataset_splits, split_path=split_path, seed=2)
+        assert not np.array_equal(train_index1, train_index2), "Different seeds should not share a split file."
+
+        _, train_index, _, _ = graph.get_edge_mask(dataset_splits, split_path=split_path, seed=1)
+        assert np.array_equal(train_index, train_index1), "A seed should read back its own split file."
+        assert sorted(os.listdir(split_dir)) == ["split-1.npz", "split-2.npz"], "Every seed should have its own file."
+    finally:
+        shutil.rmtree(split_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    _test_seeded_edge_splits()
+    _test_seeded_split_files()
@@ -17,6 +17,7 @@ class SparseGC(layers.Layer):
                  activation=tf.nn.relu,
                  sparse_features=True,
                  num_elements=-1,
+                 chebyshev_degree=-1,
                  **kwargs):
         self.input_dim = input_dim
         self.output_dim = output_dim
@@ -25,12 +26,17 @@ class SparseGC(layers.Layer):
         self.activation = activation
         self.sparse_features = sparse_features
         self.num_elements = num_elements
+        # If chebyshev_degree >= 0, `supports` is just the scaled laplacian and the layer applies the Chebyshev
+        # polynomial of that degree to the hidden representation instead of using one support per term.
+        self.chebyshev_degree = chebyshev_degree
 
         super(SparseGC, self).__init__(**kwargs)
 
     def build(self, input_shape):
 
         support_size = len(self.supports)
+        if (self.chebyshev_degree >= 0):
+            support_size = self.chebyshev_degree + 1
 
         # There is no need to maintain this ds as I can always access the layers by calling self.l but I am keeping it
         # for now as it just makes life easier.
@@ -62,21 +68,85 @@ class SparseGC(layers.Layer):
         else:
             inputs = tf.nn.dropout(inputs, keep_prob=1 - self.dropout_rate)
 
-        supports = []
-        for i in range(len(self.supports)):
-            supports.append(
-                sparse_dotproduct_op(
-                    self.supports[i], dotproduct_op(
-                        inputs, self.support_kernels[i]
-                    )
-                )
-            )
-        output = tf.add_n(supports)
+        if (self.chebyshev_degree >= 0):
+            output = self._chebyshev_op(inputs, dotproduct_op, sparse_dotproduct_op)
+        elif (self.sparse_features):
+            # The sparse inputs can only be multiplied with dense matrices so the kernels are always applied first
+            output = self._kernel_first_op(inputs, dotproduct_op, sparse_dotproduct_op)
+        else:
+            output = tf.cond(self._is_kernel_first(inputs),
+                             lambda: self._kernel_first_op(inputs, dotproduct_op, sparse_dotproduct_op),
+                             lambda: self._support_first_op(inputs, sparse_dotproduct_op))
         output = tf.add(output, self.bias)
         if self.activation is not None:
             output = self.activation(output)
         return output
 
+    def _fused_kernel_op(self, inputs, dotproduct_op):
+        '''
+        Method to compute inputs . W_k for all the support kernels with a single product inputs . [W_0|...|W_K].
+        Returns the list of the (nodes X output_dim) products, one per kernel.
+        '''
+        if (len(self.support_kernels) == 1):
+            return [dotproduct_op(inputs, self.support_kernels[0])]
+        hidden = dotproduct_op(inputs, tf.concat(self.support_kernels, axis=1))
+        return tf.split(hidden, len(self.support_kernels), axis=1)
+
+    def _kernel_first_op(self, inputs, dotproduct_op, sparse_dotproduct_op):
+        '''Method to compute sum_k A_k . (inputs . W_k)'''
+        hidden = self._fused_kernel_op(inputs, dotproduct_op)
+        return tf.add_n([sparse_dotproduct_op(support, hidden[i]) for i, support in enumerate(self.supports)])
+
+    def _support_first_op(self, inputs, sparse_dotproduct_op):
+        '''
+        Method to compute the same sum as [A_0 . inputs|...|A_K . inputs] . [W_0;...;W_K], with a single product for
+        all the kernels. The inputs have to be dense.
+        '''
+        if (len(self.supports) == 1):
+            return tf.matmul(sparse_dotproduct_op(self.supports[0], inputs), self.support_kernels[0])
+        propagated = tf.concat([sparse_dotproduct_op(support, inputs) for support in self.supports], axis=1)
+        return tf.matmul(propagated, tf.concat(self.support_kernels, axis=0))
+
+    def _is_kernel_first(self, inputs):
+        '''
+        Method to decide, at run time, if A . (X . W) needs fewer multiplications than (A . X) . W.
+        The first costs in_rows.input_dim.K.output_dim + nnz(A).output_dim and the second costs
+        nnz(A).input_dim + out_rows.K.input_dim.output_dim, where K is the number of supports. The number of rows and
+        of non zero entries of the supports are only known once they are fed, say for the mini-batch blocks.
+        '''
+        kernel_size = len(self.supports) * self.input_dim * self.output_dim
+        in_rows = tf.cast(tf.shape(inputs)[0], tf.int64)
+        out_rows = self.supports[0].dense_shape[0]
+        nnz = tf.add_n([tf.cast(tf.shape(support.values)[0], tf.int64) for support in self.supports])
+        kernel_first_cost = in_rows * kernel_size + nnz * self.output_dim
+        support_first_cost = nnz * self.input_dim + out_rows * kernel_size
+        return tf.less_equal(kernel_first_cost, support_first_cost)
+
+    def _chebyshev_op(self, inputs, dotproduct_op, sparse_dotproduct_op):
+        '''
+        Method to compute sum_k T_k(L) . inputs . W_k without materialising the T_k matrices.
+        We use the Clenshaw recurrence b_k = H_k + 2 L b_(k+1) - b_(k+2), with H_k = inputs . W_k, so only products of
+        the scaled laplacian L with dense (nodes X output_dim) matrices are needed. The sum is H_0 + L b_1 - b_2.
+        '''
+        laplacian = self.supports[0]
+        hidden = self._fused_kernel_op(inputs, dotproduct_op)
+
+        next_term, next_next_term = None, None
+        for k in range(self.chebyshev_degree, 0, -1):
+            term = hidden[k]
+            if next_term is not None:
+                term = term + 2 * sparse_dotproduct_op(laplacian, next_term)
+            if next_next_term is not None:
+                term = term - next_next_term
+            next_term, next_next_term = term, next_term
+
+        output = hidden[0]
+        if next_term is not None:
+            output = output + sparse_dotproduct_op(laplacian, next_term)
+        if next_next_term is not None:
+            output = output - next_next_term
+        return output
+
     def compute_output_shape(self, input_shape):
         return (input_shape[0], self.output_dim)
 
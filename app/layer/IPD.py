@@ -1,6 +1,6 @@
 import tensorflow as tf
 from tensorflow.contrib.keras import layers
-from app.layer.util import sparse_dropout, get_dotproduct_op, get_transpose_op
+from app.layer.util import sparse_dropout, get_dotproduct_op, get_transpose_op, pair_inner_product
 
 # Code borrowed from
 # * https://keras.io/layers/writing-your-own-keras-layers/
@@ -48,4 +48,43 @@ class InnerProductDecoder(layers.Layer):
         return output
 
     def compute_output_shape(self, input_shape):
-        return (input_shape[0], self.output_dim)
\ No newline at end of file
+        return (input_shape[0], self.output_dim)
+
+
+class PairInnerProductDecoder(layers.Layer):
+    '''
+    Sibling of the InnerProductDecoder which scores only the given (i, j) node pairs instead of all the N^2 pairs.
+    The layer is called with a list of the node representation and an int64 tensor of node pairs of shape (pairs, 2)
+    and returns one score per pair.
+    '''
+
+    def __init__(self,
+                 input_dim,
+                 output_dim,
+                 dropout_rate=0.0,
+                 activation=tf.nn.sigmoid,
+                 **kwargs):
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.dropout_rate = dropout_rate
+        self.activation = activation
+
+        super(PairInnerProductDecoder, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+
+        super(PairInnerProductDecoder, self).build(input_shape)  # Be sure to call this somewhere!
+
+    def call(self, inputs, mask=None):
+        node_representation, pairs = inputs
+        node_representation = tf.nn.dropout(node_representation, keep_prob=1 - self.dropout_rate)
+
+        output = pair_inner_product(node_representation, pairs)
+
+        if self.activation is not None:
+            output = self.activation(output)
+
+        return output
+
+    def compute_output_shape(self, input_shape):
+        return (input_shape[1][0],)
@@ -1,26 +1,33 @@
 import tensorflow as tf
 
 def sparse_dropout(x, keep_prob, noise_shape=None, seed=None, name=None):
-    '''borrowed logic and implementation from https://github.com/tensorflow/tensorflow/blob/r1.4/tensorflow/python/ops/nn_ops.py'''
+    '''borrowed logic and implementation from https://github.com/tensorflow/tensorflow/blob/r1.4/tensorflow/python/ops/nn_ops.py
+    The noise shape is read from `x.values` at run time unless a static `noise_shape` with a positive size is given.
+    The dropped values are zeroed out and the kept ones rescaled by a single multiplication of the values, so the
+    indices of `x` are reused as they are instead of being gathered into a new SparseTensor by tf.sparse_retain. The
+    dropped entries are kept as explicit zeros.'''
 
     # Skipping all the assertions
 
     if (keep_prob == 1):
         return x
 
+    if (noise_shape is None or noise_shape[0] <= 0):
+        noise_shape = tf.shape(x.values)
+
     # uniform [keep_prob, 1.0 + keep_prob)
     random_tensor = keep_prob
     random_tensor += tf.random_uniform(noise_shape,
                                        seed=seed,
                                        dtype=x.dtype)
 
-    # 0. if [keep_prob, 1.0) and 1. if [1.0, 1.0 + keep_prob)
-    binary_tensor = tf.floor(random_tensor)
-    # Typecase necessary as mentioned on https://www.tensorflow.org/api_docs/python/tf/sparse_retain
-    binary_tensor = tf.cast(binary_tensor, dtype=tf.bool)
-    ret = tf.sparse_retain(x, binary_tensor)
-    ret = ret * (1 / keep_prob)
-    return ret
+    # 0. if [keep_prob, 1.0) and 1 / keep_prob if [1.0, 1.0 + keep_prob)
+    scale = tf.floor(random_tensor) / keep_prob
+    return tf.SparseTensor(indices=x.indices, values=x.values * scale, dense_shape=x.dense_shape)
+
+def pair_inner_product(x, pairs):
+    '''Method to compute the inner products x[i].x[j] for the (i, j) node pairs in the rows of `pairs`'''
+    return tf.reduce_sum(tf.gather(x, pairs[:, 0]) * tf.gather(x, pairs[:, 1]), axis=1)
 
 def get_dotproduct_op(sparse_features=True):
     if (sparse_features):
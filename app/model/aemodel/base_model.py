@@ -1,8 +1,9 @@
-from app.utils.constant import GCN_AE, SUPPORTS, MODE, TRAIN, NORMALISATION_CONSTANT, LOSS, ACCURACY
+from app.utils.constant import GCN_AE, SUPPORTS, MODE, TRAIN, NORMALISATION_CONSTANT, LOSS, ACCURACY, PAIRS, \
+    PAIR_LABELS
 from app.model import base_model
 
 from app.layer.GC import SparseGC
-from app.layer.IPD import InnerProductDecoder
+from app.layer.IPD import InnerProductDecoder, PairInnerProductDecoder
 
 import tensorflow as tf
 import numpy as np
@@ -14,6 +15,7 @@ class Base_Model(base_model.Base_Model):
         super(Base_Model, self).__init__(model_params=model_params,
                                     sparse_model_params=sparse_model_params,
                                     placeholder_dict=placeholder_dict)
+        self.sparse_labels = self.labels
         self.labels = tf.sparse_tensor_to_dense(self.labels)
         # We feed in the adjacency matrix in the sparse format and then make it dense
 
@@ -31,6 +33,11 @@ class Base_Model(base_model.Base_Model):
 
         self.embeddings = None
 
+        # Node pairs to score at evaluation time, their labels and their scores
+        self.pairs = placeholder_dict[PAIRS]
+        self.pair_labels = placeholder_dict[PAIR_LABELS]
+        self.pair_scores = None
+
 
         # For GCN AE model, the support is just the adj matrix. For clarity, we would save it another param, self.adj
         # We could have set this as one of the params in the AutoEncoderModelParams but are sending it via the
@@ -39,51 +46,142 @@ class Base_Model(base_model.Base_Model):
 
         self.normalisation_constant = placeholder_dict[NORMALISATION_CONSTANT]
         self.positive_sample_weight = autoencoder_model_params.positive_sample_weight
+        self.node_count = autoencoder_model_params.node_count
+
+        # If negative_sample_count > 0, the training loss is computed over the positive edges and
+        # negative_sample_count sampled node pairs instead of the dense N X N output.
+        self.negative_sample_count = model_params.negative_sample_count
+        self.pair_decoder = PairInnerProductDecoder(input_dim=self.input_dim,
+                                                    output_dim=self.input_dim,
+                                                    dropout_rate=self.dropout_rate,
+                                                    activation=lambda x: x)
+        # Sampled training pairs along with their targets, weights and logits. They are drawn once, inside the training
+        # branch, so that the loss and the accuracy are computed over the same pairs.
+        self.sampled_pairs = None
+        self.sampled_targets = None
+        self.sampled_weights = None
+        self.sampled_logits = None
+        # The (loss, accuracy) pair for the current mode
+        self.mode_metrics = None
+
+    def _compute_loss(self, labels, logits):
+        '''Method to compute the elementwise weighted cross entropy loss'''
+        return tf.nn.weighted_cross_entropy_with_logits(
+                            targets = labels,
+                            logits = logits,
+                            pos_weight=self.positive_sample_weight
+                        )
 
+    def _masked_entries_op(self):
+        '''
+        Operator to return the labels and the logits for just the entries in self.mask, in the order of
+        self.mask.indices. The logits are computed from the embeddings of the masked pairs and the labels are
+        self.pair_labels, which DataPipelineAE lines up with the mask, so no N X N tensor is built.
+        '''
+        return self.pair_labels, self.pair_decoder([self.embeddings, self.mask.indices])
 
-    def _loss_op(self):
-        '''Operator to compute the loss for the model.
-        This method should not be directly called the variables outside the class.
-        Not we do not need to initialise the loss as zero for each batch as process the entire data in just one batch.'''
+    def _compute_masked_loss(self, labels, logits):
+        '''Method to compute the masked loss from the `labels` and `logits` of the entries in self.mask'''
+        normalized_mask = self.mask.values / tf.reduce_sum(self.mask.values)
+        return tf.reduce_sum(self._compute_loss(labels=labels, logits=logits) * normalized_mask)
 
-        complete_loss = tf.nn.weighted_cross_entropy_with_logits(
-                            targets = self.labels,
-                            logits = self.outputs,
-                            pos_weight=self.positive_sample_weight
-                        )
+    def _compute_masked_accuracy(self, labels, logits):
+        '''Method to compute the masked accuracy from the `labels` and `logits` of the entries in self.mask'''
+        normalized_mask = self.mask.values / tf.reduce_sum(self.mask.values)
+        predictions = tf.cast(tf.greater_equal(logits, 0.0), dtype=tf.float32)
+        correct_predictions = tf.cast(tf.equal(predictions, labels), dtype=tf.float32)
+        return tf.reduce_sum(correct_predictions * normalized_mask, name="accuracy_op")
 
-        def _compute_masked_loss(complete_loss):
-            '''Method to compute the masked loss'''
-            normalized_mask = self.mask / tf.sparse_reduce_sum(self.mask)
-            complete_loss = tf.multiply(complete_loss, tf.sparse_tensor_to_dense(normalized_mask))
-            return tf.reduce_sum(complete_loss)
-            # the sparse_tensor_to_dense would be the bottleneck step and should be replaced by something more efficient
+    def _pair_score_op(self):
+        '''Operator to compute the scores for just the node pairs in self.pairs'''
+        return tf.sigmoid(self.pair_decoder([self.embeddings, self.pairs]), name="pair_scores")
 
-        complete_loss = tf.cond(tf.equal(self.mode, TRAIN),
-                                true_fn=lambda : tf.reduce_mean(complete_loss),
-                                false_fn=lambda : _compute_masked_loss(complete_loss))
+    def _sampled_pairs_op(self):
+        '''
+        Operator to return the training pairs (the positive edges followed by negative_sample_count node pairs sampled
+        uniformly), their targets and their weights. The negative pairs are weighted by (N^2 - P) / negative_sample_count
+        so that the weighted sums over the pairs estimate the sums over all the N^2 pairs. A sampled pair may be a
+        positive edge as well, which is ignored as it happens with probability P / N^2.
+        '''
+        positive_pairs = self.sparse_labels.indices
+        positive_count = tf.cast(tf.shape(positive_pairs)[0], tf.float32)
+        negative_pairs = tf.random_uniform(shape=[self.negative_sample_count, 2],
+                                           maxval=self.sparse_labels.dense_shape[0],
+                                           dtype=tf.int64)
+        total_count = tf.square(tf.cast(self.sparse_labels.dense_shape[0], tf.float32))
+        negative_weight = (total_count - positive_count) / self.negative_sample_count
+
+        pairs = tf.concat([positive_pairs, negative_pairs], axis=0)
+        targets = tf.concat([self.sparse_labels.values, tf.zeros([self.negative_sample_count])], axis=0)
+        weights = tf.concat([tf.ones_like(self.sparse_labels.values),
+                             tf.fill([self.negative_sample_count], negative_weight)], axis=0) / total_count
+        return pairs, targets, weights
+
+    def _sample_pairs(self):
+        '''Method to draw the sampled training pairs and to compute their logits'''
+        self.sampled_pairs, self.sampled_targets, self.sampled_weights = self._sampled_pairs_op()
+        self.sampled_logits = self.pair_decoder([self.embeddings, self.sampled_pairs])
+
+    def _sampled_loss_op(self):
+        '''Operator to estimate the training loss, that is the mean loss over all the N^2 pairs, in O(E) time'''
+        return tf.reduce_sum(self._compute_loss(labels=self.sampled_targets, logits=self.sampled_logits)
+                             * self.sampled_weights)
+
+    def _sampled_accuracy_op(self):
+        '''Operator to estimate the training accuracy over all the N^2 pairs in O(E) time'''
+        predictions = tf.cast(tf.greater_equal(self.sampled_logits, 0.0), dtype=tf.float32)
+        correct_predictions = tf.cast(tf.equal(predictions, self.sampled_targets), dtype=tf.float32)
+        return tf.reduce_sum(correct_predictions * self.sampled_weights, name="accuracy_op")
+
+    def _decoder_op(self, embeddings):
+        '''Operator to decode the `embeddings` to the dense N X N logits'''
+        return self.layers[-1](embeddings)
+
+    def _train_metrics_op(self):
+        '''
+        Operator to compute the training loss and accuracy, over the sampled pairs if negative_sample_count > 0 and over
+        the dense N X N output otherwise. The dense labels and logits are built here, and not from self.labels and
+        self.outputs, so that they only exist in the training branch.
+        '''
+        if (self.negative_sample_count > 0):
+            self._sample_pairs()
+            return self._sampled_loss_op(), self._sampled_accuracy_op()
+
+        labels = tf.sparse_tensor_to_dense(self.sparse_labels)
+        logits = self._decoder_op(self.embeddings)
+        predictions = tf.cast(tf.greater_equal(logits, 0.0), dtype=tf.float32)
+        correct_predictions = tf.cast(tf.equal(predictions, labels), dtype=tf.float32)
+        return tf.reduce_mean(self._compute_loss(labels=labels, logits=logits)), \
+               tf.reduce_mean(correct_predictions, name="accuracy_op")
+
+    def _eval_metrics_op(self):
+        '''Operator to compute the loss and the accuracy over the entries in self.mask'''
+        labels, logits = self._masked_entries_op()
+        return self._compute_masked_loss(labels=labels, logits=logits), \
+               self._compute_masked_accuracy(labels=labels, logits=logits)
+
+    def _mode_metrics_op(self):
+        '''
+        Method to compute the (loss, accuracy) pair for the current mode. Tensors used inside tf.cond are evaluated for
+        both the branches, so each branch builds everything it needs and a single tf.cond is shared by the loss and the
+        accuracy. This keeps the evaluation free of any N X N tensor.
+        '''
+        self.mode_metrics = tf.cond(tf.equal(self.mode, TRAIN),
+                                    true_fn=lambda: self._train_metrics_op(),
+                                    false_fn=lambda: self._eval_metrics_op())
 
+    def _loss_op(self):
+        '''Operator to compute the loss for the model.
+        This method should not be directly called the variables outside the class.
+        Not we do not need to initialise the loss as zero for each batch as process the entire data in just one batch.'''
 
-        return complete_loss * self.normalisation_constant
+        return self.mode_metrics[0] * self.normalisation_constant
 
     def _accuracy_op(self):
         '''Operator to compute the accuracy for the model.
         This method should not be directly called the variables outside the class.'''
 
-        correct_predictions = tf.cast(tf.equal(self.predictions,
-                                       self.labels), dtype=tf.float32)
-
-        def _compute_masked_accuracy(correct_predictions):
-            '''Method to compute the masked loss'''
-            normalized_mask = self.mask / tf.sparse_reduce_sum(self.mask)
-            correct_predictions = tf.multiply(correct_predictions, tf.sparse_tensor_to_dense(normalized_mask))
-            return tf.reduce_sum(correct_predictions, name="accuracy_op")
-
-        accuracy = tf.cond(tf.equal(self.mode, TRAIN),
-                                true_fn=lambda: tf.reduce_mean(correct_predictions, name="accuracy_op"),
-                                false_fn=lambda: _compute_masked_accuracy(correct_predictions))
-
-        return accuracy
+        return self.mode_metrics[1]
 
     def _prediction_op(self):
         '''Operator to compute the predictions from the model'''
@@ -134,11 +232,11 @@ class Base_Model(base_model.Base_Model):
 
 
         def _compute_auc_masked():
-            labels = self.mask.indices
+            labels, logits = self._masked_entries_op()
             return tf.metrics.auc(
-                labels=self.labels,
-                predictions=tf.sigmoid(self.outputs),
-                weights=tf.sparse_tensor_to_dense(self.mask),
+                labels=labels,
+                predictions=tf.sigmoid(logits),
+                weights=self.mask.values,
                 name="auc_op"
             )
 
@@ -160,10 +258,12 @@ class Base_Model(base_model.Base_Model):
 
     def _compute_metrics(self):
         '''Method to compute the metrics of interest'''
+        self.embeddings = self.activations[2]
+        self._mode_metrics_op()
+        self.pair_scores = self._pair_score_op()
         self.predictions = self._prediction_op()
         self.loss = self._loss_op()
         self.accuracy = self._accuracy_op()
-        self.embeddings = self.activations[2]
         tf.summary.scalar(LOSS, self.loss)
         tf.summary.scalar(ACCURACY, self.accuracy)
         self.summary_op = tf.summary.merge_all()
\ No newline at end of file
@@ -51,10 +51,12 @@ class Model(base_model.Base_Model):
 
     def _compute_metrics(self):
         '''Method to compute the metrics of interest'''
+        self.embeddings = self.activations[2]
+        self._mode_metrics_op()
+        self.pair_scores = self._pair_score_op()
         self.predictions = self._prediction_op()
         self.loss = self._loss_op()
         self.accuracy = self._accuracy_op()
-        self.embeddings = self.activations[2]
         tf.summary.scalar(LOSS, self.loss)
         tf.summary.scalar(ACCURACY, self.accuracy)
         self.summary_op = tf.summary.merge_all()
\ No newline at end of file
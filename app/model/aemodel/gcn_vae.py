@@ -28,7 +28,6 @@ class Model(base_model.Base_Model):
         self.log_sigma_encoder = None
         self.z = None
         self.decoder = None
-        self.node_count = autoencoder_model_params.node_count
 
         self.model_op()
 
@@ -55,6 +54,10 @@ class Model(base_model.Base_Model):
 
         return liklihood_loss + kl_loss
 
+    def _decoder_op(self, embeddings):
+        '''Operator to decode the `embeddings` to the dense N X N logits'''
+        return self.decoder(embeddings)
+
     def _mean_encoder_op(self):
         '''Component of the encoder op which learns the mean'''
         return SparseGC(input_dim=self.model_params.hidden_layer1_size,
@@ -138,10 +141,12 @@ class Model(base_model.Base_Model):
 
     def _compute_metrics(self):
         '''Method to compute the metrics of interest'''
+        self.embeddings = self.z
+        self._mode_metrics_op()
+        self.pair_scores = self._pair_score_op()
         self.predictions = self._prediction_op()
         self.loss = self._loss_op()
         self.accuracy = self._accuracy_op()
-        self.embeddings = self.z
         tf.summary.scalar(LOSS, self.loss)
         tf.summary.scalar(ACCURACY, self.accuracy)
         self.summary_op = tf.summary.merge_all()
\ No newline at end of file
@@ -3,7 +3,7 @@ from abc import ABC, abstractmethod
 import tensorflow as tf
 
 from app.model.util import masked_softmax_loss, masked_accuracy
-from app.utils.constant import BASE_MODEL, LABELS, MASK, FEATURES, DROPOUT, LOSS, ACCURACY
+from app.utils.constant import BASE_MODEL, LABELS, MASK, FEATURES, DROPOUT, LOSS, ACCURACY, HISTORICAL_EMBEDDINGS
 
 
 class Base_Model(ABC):
@@ -20,7 +20,13 @@ class Base_Model(ABC):
         self.labels = placeholder_dict[LABELS]
         self.optimizer = tf.train.AdamOptimizer(learning_rate=model_params.learning_rate)
         self.dropout_rate = placeholder_dict[DROPOUT]
+        # Activations of the out of batch neighbors for every hidden layer, read from the historical embeddings
+        self.historical_embeddings = placeholder_dict.get(HISTORICAL_EMBEDDINGS, [])
         self.num_elements = sparse_model_params.num_elements
+        # Degree of the Chebyshev polynomial that the layers apply themselves, -1 if the supports are precomputed.
+        self.chebyshev_degree = -1
+        if (model_params.lazy_chebyshev):
+            self.chebyshev_degree = model_params.support_size - 1
         self.loss = -1
         self.accuracy = -1
         self.vars = {}
@@ -115,9 +121,13 @@ class Base_Model(ABC):
 
         self.activations = [self.inputs]
 
-        for layer in self.layers:
+        for i, layer in enumerate(self.layers):
+            inputs = self.activations[-1]
+            if (i > 0 and self.historical_embeddings):
+                # The rows of the in-batch nodes are followed by the rows of their out of batch neighbors
+                inputs = tf.concat([inputs, self.historical_embeddings[i - 1]], axis=0)
             self.activations.append(
-                layer(self.activations[-1])
+                layer(inputs)
             )
         # Activations is a list of the form input::first_hidden_layer::..::last_hidden_layer::outputs
 
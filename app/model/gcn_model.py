@@ -1,4 +1,4 @@
-from app.utils.constant import GCN_MODEL, SUPPORTS
+from app.utils.constant import GCN_MODEL, SUPPORTS, LAYER_SUPPORTS
 from app.model import base_model
 
 from app.layer.GC import SparseGC
@@ -14,6 +14,8 @@ class Model(base_model.Base_Model):
                                     placeholder_dict=placeholder_dict)
         self.name = GCN_MODEL
         self.supports = placeholder_dict[SUPPORTS]
+        # In the mini-batch mode, every layer has its own supports (the sampled blocks)
+        self.layer_supports = placeholder_dict.get(LAYER_SUPPORTS, [self.supports, self.supports])
         self.model_op()
 
     def _layers_op(self):
@@ -22,17 +24,19 @@ class Model(base_model.Base_Model):
         is to be implemented by all the subclasses'''
         self.layers.append(SparseGC(input_dim=self.input_dim,
                                     output_dim=self.model_params.hidden_layer1_size,
-                                    supports=self.supports,
+                                    supports=self.layer_supports[0],
                                     dropout_rate=self.dropout_rate,
                                     activation=tf.nn.relu,
                                     sparse_features=self.model_params.sparse_features,
                                     # sparse_features=False,
-                                    num_elements=self.num_elements))
+                                    num_elements=self.num_elements,
+                                    chebyshev_degree=self.chebyshev_degree))
 
         self.layers.append(SparseGC(input_dim=self.model_params.hidden_layer1_size,
                                     output_dim=int(self.output_shape[1]),
-                                    supports=self.supports,
+                                    supports=self.layer_supports[1],
                                     dropout_rate=self.dropout_rate,
                                     activation=lambda x: x,
                                     sparse_features=False,
-                                    num_elements=self.num_elements))
+                                    num_elements=self.num_elements,
+                                    chebyshev_degree=self.chebyshev_degree))
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+from scipy import sparse as sp
+
+from app.ds.data_pipeline import convert_sparse_matrix_to_sparse_tensor
+from app.ds.sampler import NeighborSampler
+from app.utils.constant import FEATURES, SUPPORTS
+
+
+class LayerwiseInference():
+    '''
+    Class for computing the activations of all the layers of a model for all the nodes, one layer at a time.
+    Every layer is computed in chunks of `chunk_size` rows of the supports, from just the input rows that the chunk
+    needs, and written to a N X output_dim float32 buffer which is memory-mapped from `mmap_dir` if it is given. The next
+    layer reads its inputs from this buffer so the peak memory is bounded by the chunk size instead of the graph size.
+    Every run keeps its files in a directory of its own which is removed by `release` or by the next run.
+    The `supports` are only needed (and only read) for the models with graph convolution layers, like GCN.
+    '''
+
+    def __init__(self, model, chunk_size, supports=None, mmap_dir=None):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.mmap_dir = mmap_dir
+        # Directory holding the buffers of the last run
+        self.run_dir = None
+        # Set from the features on every run
+        self.node_count = None
+        # Only used to read the full rows of the chunks along with their out of chunk neighbors
+        self.sampler = None
+        if any(getattr(layer, "supports", None) for layer in model.layers):
+            if (supports is None):
+                raise ValueError("The graph convolution layers need the supports of the graph")
+            self.sampler = NeighborSampler(supports)
+        self.layer_ops = [self._layer_op(layer, index) for index, layer in enumerate(model.layers)]
+
+    def _layer_op(self, layer, index):
+        '''
+        Method to call `layer` (sharing its weights) on new placeholders for the inputs and the supports of a chunk.
+        Returns the input placeholder, the list of support placeholders (empty for the layers without supports) and the
+        output tensor.
+        '''
+        if (getattr(layer, "chebyshev_degree", -1) >= 0):
+            raise ValueError("The lazy Chebyshev layers need the supports of the whole graph")
+
+        name = "inference_" + FEATURES + "_layer" + str(index)
+        if (layer.sparse_features):
+            inputs = tf.sparse_placeholder(tf.float32, name=name)
+        else:
+            inputs = tf.placeholder(tf.float32, shape=(None, layer.input_dim), name=name)
+        supports = [tf.sparse_placeholder(tf.float32, name="inference_" + SUPPORTS + str(i) + "_layer" + str(index))
+                    for i in range(len(getattr(layer, "supports", [])))]
+
+        # The supports of the layer are swapped for the ones of the chunk
+        layer_supports = getattr(layer, "supports", None)
+        if (supports):
+            layer.supports = supports
+        try:
+            outputs = layer(inputs)
+        finally:
+            if (supports):
+                layer.supports = layer_supports
+        return inputs, supports, outputs
+
+    def _get_buffer(self, mmap_dir, index, size):
+        '''Method to allocate the N X `size` output buffer for the layer `index`'''
+        if (mmap_dir):
+            return np.lib.format.open_memmap(os.path.join(mmap_dir, "layer" + str(index) + ".npy"), mode="w+",
+                                             dtype=np.float32, shape=(self.node_count, size))
+        return np.zeros((self.node_count, size), dtype=np.float32)
+
+    def _get_inputs(self, inputs, nodes, sparse_features):
+        '''Method to read the rows `nodes` of `inputs` in the format expected by the layer'''
+        rows = inputs[nodes]
+        if (sparse_features):
+            return convert_sparse_matrix_to_sparse_tensor(sp.csr_matrix(rows))
+        if (sp.issparse(rows)):
+            return rows.toarray()
+        return np.asarray(rows, dtype=np.float32)
+
+    def run(self, sess, features):
+        '''
+        Method to compute the activations of all the layers for all the nodes, starting from `features`.
+        Returns the list of the N X output_dim buffers, one per layer, in the order of model.layers.
+        '''
+        self.release()
+        self.node_count = features.shape[0]
+        if (self.sampler is not None and self.sampler.node_count != self.node_count):
+            raise ValueError("The supports have {} nodes but the features have {} rows".format(
+                self.sampler.node_count, self.node_count))
+        if (self.mmap_dir):
+            if not os.path.exists(self.mmap_dir):
+                os.makedirs(self.mmap_dir)
+            self.run_dir = tempfile.mkdtemp(prefix="inference-", dir=self.mmap_dir)
+
+        activations = []
+        inputs = features
+        for index, (layer, (input_placeholder, support_placeholders, output_op)) in enumerate(
+                zip(self.model.layers, self.layer_ops)):
+            outputs = self._get_buffer(self.run_dir, index, layer.output_dim)
+            for start in range(0, self.node_count, self.chunk_size):
+                nodes = np.arange(start, min(start + self.chunk_size, self.node_count))
+                feed_dict = {self.model.dropout_rate: 0}
+                input_nodes = nodes
+                if (support_placeholders):
+                    halo, blocks = self.sampler.sample_halo(nodes)
+                    input_nodes = np.concatenate((nodes, halo))
+                    for placeholder, block in zip(support_placeholders, blocks):
+                        feed_dict[placeholder] = convert_sparse_matrix_to_sparse_tensor(block)
+                feed_dict[input_placeholder] = self._get_inputs(inputs, input_nodes, layer.sparse_features)
+                outputs[start:start + nodes.shape[0]] = sess.run(output_op, feed_dict=feed_dict)
+            activations.append(outputs)
+            inputs = outputs
+        return activations
+
+    def release(self):
+        '''Method to remove the memory-mapped buffers of the last run, if any'''
+        if (self.run_dir):
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
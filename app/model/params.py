@@ -1,4 +1,4 @@
-from app.utils.constant import GCN, SYMMETRIC, GCN_POLY
+from app.utils.constant import GCN, SYMMETRIC, GCN_POLY, FF, SGC, RANDOM_WALK
 from app.utils.util import get_class_variables
 from abc import ABC, abstractmethod
 
@@ -36,11 +36,35 @@ class ModelParams(Params):
             self.support_size = flags.poly_degree + 1
         except AttributeError:
             self.support_size = 1
-        self.norm_mode = SYMMETRIC
+        self.norm_mode = flags.norm_mode
+        self.num_hops = flags.num_hops
+        self.concat_hops = flags.concat_hops
         self.tensorboard_logs_dir = flags.tensorboard_logs_dir
         if(self.tensorboard_logs_dir == ""):
             self.tensorboard_logs_dir = None
         self.num_exp = flags.num_exp
+        self.cache_dir = flags.cache_dir
+        if(self.cache_dir == ""):
+            self.cache_dir = None
+        self.mmap_features = flags.mmap_features
+        self.resident_graph = flags.resident_graph
+        self.lazy_chebyshev = flags.lazy_chebyshev
+        self.lambda_max_mode = flags.lambda_max_mode
+        self.edge_split_path = flags.edge_split_path
+        if(self.edge_split_path == ""):
+            self.edge_split_path = None
+        self.negative_sample_count = flags.negative_sample_count
+        self.split_seeds = [int(seed) for seed in flags.split_seeds.split(",") if seed.strip()]
+        self.batch_size = flags.batch_size
+        self.fanouts = [int(fanout) for fanout in flags.fanouts.split(",") if fanout.strip()]
+        self.num_workers = flags.num_workers
+        self.prefetch_size = flags.prefetch_size
+        self.num_clusters = flags.num_clusters
+        self.clusters_per_batch = flags.clusters_per_batch
+        self.historical_embeddings = flags.historical_embeddings
+        self.mmap_history = flags.mmap_history
+        self.inference_chunk_size = flags.inference_chunk_size
+        self.mmap_inference = flags.mmap_inference
         self.populate_params()
 
     def populate_params(self):
@@ -48,8 +72,47 @@ class ModelParams(Params):
         Method to populate all the params for the model
         '''
 
+        if (self.norm_mode not in (SYMMETRIC, RANDOM_WALK)):
+            # Any other value would silently fall back to the random walk normalisation
+            raise ValueError("Unsupported norm_mode {}. Supported values are {} and {}".format(
+                self.norm_mode, SYMMETRIC, RANDOM_WALK))
+
         if (self.model_name != GCN_POLY):
             self.support_size = 1
+            self.lazy_chebyshev = False
+
+        if (self.model_name == SGC):
+            # The model is trained over the propagated features, which are dense
+            self.sparse_features = False
+
+        # Number of support matrices fed to the model. In the lazy Chebyshev mode, only the scaled laplacian is fed
+        # and the polynomial terms are applied by the layers.
+        self.num_supports = self.support_size
+        if (self.lazy_chebyshev):
+            self.num_supports = 1
+
+        if (self.batch_size > 0):
+            # The mini-batches feed the sampled blocks of the supports, which the lazy Chebyshev mode can not use, and
+            # they are fed per step so the graph can not be made resident.
+            self.lazy_chebyshev = False
+            self.num_supports = self.support_size
+            self.resident_graph = False
+            # One fan-out per graph convolution layer. The gcn models have two such layers and the ff and sgc models
+            # have none.
+            num_layers = 0 if self.model_name in [FF, SGC] else 2
+            if (len(self.fanouts) <= 1):
+                self.fanouts = (self.fanouts or [0]) * num_layers
+            self.fanouts = self.fanouts[:num_layers]
+        if (self.batch_size <= 0 or self.model_name in [FF, SGC]):
+            # The historical embeddings are only used by the mini-batches of the graph convolution models
+            self.historical_embeddings = False
+        if (self.model_name == GCN_POLY and self.lazy_chebyshev and self.inference_chunk_size > 0):
+            # The lazy Chebyshev layers can not be computed over the row chunks of the scaled laplacian
+            print("The layer-wise inference is turned off as the lazy Chebyshev layers need the whole graph")
+            self.inference_chunk_size = 0
+        if (self.cache_dir is None):
+            self.mmap_history = False
+            self.mmap_inference = False
 
 
 class SparseModelParams(Params):
@@ -57,7 +120,8 @@ class SparseModelParams(Params):
     Class for the params that are used when sparse data representation is used.
     '''
 
-    def __init__(self, num_elements, feature_size):
+    def __init__(self, feature_size, num_elements=-1):
+        # Number of non zero features, for a static dropout noise shape. If -1, it is read at run time.
         self.num_elements = num_elements
         self.feature_size = feature_size
 
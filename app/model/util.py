@@ -1,24 +1,21 @@
 import tensorflow as tf
 
 def masked_softmax_loss(labels, logits, mask):
-    '''Softmax loss with mask'''
-    complete_loss = tf.nn.softmax_cross_entropy_with_logits(labels=labels,
-                                                            logits=logits)
-    normalized_mask = mask / tf.reduce_sum(mask)
+    '''Softmax loss with mask. `mask` is the vector of indices of the rows to compute the loss over.'''
+    labels = tf.gather(labels, mask)
+    logits = tf.gather(logits, mask)
+    masked_loss = tf.nn.softmax_cross_entropy_with_logits(labels=tf.cast(labels, logits.dtype),
+                                                          logits=logits)
 
-    normalized_masked_loss = complete_loss * normalized_mask
-
-    return tf.reduce_sum(normalized_masked_loss)
+    return tf.reduce_mean(masked_loss)
 
 def masked_accuracy(labels, logits, mask):
-    '''Accuracy with mask'''
-    complete_prediction = tf.equal(x=tf.argmax(labels, 1),
-                                   y=tf.argmax(logits, 1))
-
-    complete_prediction = tf.cast(complete_prediction, tf.float32)
-
-    normalized_mask = mask / tf.reduce_sum(mask)
+    '''Accuracy with mask. `mask` is the vector of indices of the rows to compute the accuracy over.'''
+    labels = tf.gather(labels, mask)
+    logits = tf.gather(logits, mask)
+    masked_prediction = tf.equal(x=tf.argmax(labels, 1),
+                                 y=tf.argmax(logits, 1))
 
-    normalized_prediction = complete_prediction * normalized_mask
+    masked_prediction = tf.cast(masked_prediction, tf.float32)
 
-    return tf.reduce_sum(normalized_prediction)
+    return tf.reduce_mean(masked_prediction)
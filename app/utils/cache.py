@@ -0,0 +1,128 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy import sparse as sp
+
+# Bump this whenever the layout of the cached files changes so that stale caches are rebuilt.
+CACHE_VERSION = "1"
+
+# Written last so that a partially written cache is never considered valid.
+COMPLETE_MARKER = "_COMPLETE"
+
+
+def fingerprint_files(paths, extra=()):
+    '''Method to compute a content hash of the files in `paths` along with the strings in `extra`'''
+    sha = hashlib.sha1(CACHE_VERSION.encode("utf-8"))
+    for value in extra:
+        sha.update(str(value).encode("utf-8"))
+    for path in paths:
+        sha.update(os.path.basename(path).encode("utf-8"))
+        if not os.path.exists(path):
+            sha.update(b"missing")
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def fingerprint_sparse_matrix(matrix, extra=()):
+    '''Method to compute a content hash of the sparse `matrix` along with the strings in `extra`'''
+    matrix = sp.csr_matrix(matrix)
+    if not matrix.has_canonical_format:
+        matrix = matrix.copy()
+        matrix.sum_duplicates()
+    sha = hashlib.sha1(CACHE_VERSION.encode("utf-8"))
+    for value in list(extra) + [matrix.shape, matrix.dtype]:
+        sha.update(str(value).encode("utf-8"))
+    for array in [matrix.indptr, matrix.indices, matrix.data]:
+        sha.update(np.ascontiguousarray(array).view(np.uint8))
+    return sha.hexdigest()
+
+
+def get_cache_path(cache_dir, name, fingerprint):
+    '''Method to return the directory in `cache_dir` which holds the cache for `name` with the given `fingerprint`'''
+    return os.path.join(cache_dir, "{}-{}".format(name, fingerprint))
+
+
+def is_valid_cache(cache_path):
+    '''Method to check if a complete cache exists at `cache_path`'''
+    return os.path.exists(os.path.join(cache_path, COMPLETE_MARKER))
+
+
+def write_cache(cache_path, write_fn):
+    '''
+    Method to populate the cache at `cache_path` by calling `write_fn` with a directory to write the files into.
+    The files are written to a temporary directory first which is then renamed so that concurrent runs never see a
+    partial cache.
+    '''
+    cache_dir = os.path.dirname(cache_path)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir)
+    write_fn(tmp_path)
+    open(os.path.join(tmp_path, COMPLETE_MARKER), "w").close()
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # Some other run has already populated the cache
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def save_arrays(cache_path, arrays):
+    '''
+    Method to save the dict of `arrays` to `cache_path`.
+    Sparse matrices are saved as CSR `.npz` files and everything else as `.npy` files.
+    '''
+
+    def _write(path):
+        for name, array in arrays.items():
+            if sp.issparse(array):
+                sp.save_npz(os.path.join(path, name + ".npz"), array.tocsr(), compressed=False)
+            else:
+                np.save(os.path.join(path, name + ".npy"), np.asarray(array))
+
+    write_cache(cache_path, _write)
+
+
+def load_arrays(cache_path, names, mmap_mode=None):
+    '''Method to load the arrays saved by `save_arrays`. Returns a dict with None for the names which are missing.'''
+    arrays = {}
+    for name in names:
+        sparse_path = os.path.join(cache_path, name + ".npz")
+        dense_path = os.path.join(cache_path, name + ".npy")
+        if os.path.exists(sparse_path):
+            arrays[name] = sp.load_npz(sparse_path)
+        elif os.path.exists(dense_path):
+            arrays[name] = np.load(dense_path, mmap_mode=mmap_mode)
+        else:
+            arrays[name] = None
+    return arrays
+
+
+def split_csr(name, matrix):
+    '''
+    Method to split the sparse `matrix` into a dict of plain arrays for `save_arrays`.
+    Unlike `.npz` files, these arrays can be memory-mapped by `load_arrays`. Use `join_csr` to rebuild the matrix.
+    '''
+    matrix = sp.csr_matrix(matrix)
+    return {
+        name + "_data": matrix.data,
+        name + "_indices": matrix.indices,
+        name + "_indptr": matrix.indptr,
+        name + "_shape": np.asarray(matrix.shape)
+    }
+
+
+def join_csr(name, arrays):
+    '''Method to rebuild the CSR matrix saved with `split_csr` from the dict of `arrays`'''
+    return sp.csr_matrix((arrays[name + "_data"], arrays[name + "_indices"], arrays[name + "_indptr"]),
+                         shape=tuple(arrays[name + "_shape"]), copy=False)
+
+
+def get_csr_names(name):
+    '''Method to return the names of the arrays written by `split_csr`'''
+    return [name + suffix for suffix in ["_data", "_indices", "_indptr", "_shape"]]
@@ -1,15 +1,23 @@
 ACCURACY = "accuracy"
+ANALYTIC = "analytic"
+ARPACK = "arpack"
 AVERAGE_PRECISION_RECALL_SCORE = "Average Precision Recall Score"
 AUCSCORE = "AUC Score"
 BASE_MODEL = "base_model"
+BATCH_SIZE = "batch_size"
 BIAS = "bias"
+CACHE_DIR = "cache_dir"
 CITESEER = "citeseer"
+CLUSTERS_PER_BATCH = "clusters_per_batch"
+CONCAT_HOPS = "concat_hops"
 CORA = "cora"
 DATA_DIR = "data_dir"
 DATASET_NAME = "dataset_name"
 DROPOUT = "dropout"
 EARLY_STOPPING = "early_stopping"
+EDGE_SPLIT_PATH = "edge_split_path"
 EPOCHS = "epochs"
+FANOUTS = "fanouts"
 FEATURE = "feature"
 FEATURES = "features"
 FF = "ff"
@@ -21,23 +29,45 @@ GCN_POLY = "gcn_poly"
 GCN_VAE = "gcn_vae"
 HIDDEN_LAYER1_SIZE = "hidden_layer1_size"
 HIDDEN_LAYER2_SIZE = "hidden_layer2_size"
+HISTORICAL_EMBEDDINGS = "historical_embeddings"
+INFERENCE_CHUNK_SIZE = "inference_chunk_size"
 KERNEL = "kernel"
 SUPPORT_KERNEL = "support_kernel"
 L2_WEIGHT = "l2_weight"
 LABEL = "label"
 LABELS = "labels"
+LAMBDA_MAX_MODE = "lambda_max_mode"
+LAYER_SUPPORTS = "layer_supports"
+LAZY_CHEBYSHEV = "lazy_chebyshev"
 LEARNING_RATE = "learning_rate"
 LOSS = "loss"
 MASK = "mask"
+MMAP_FEATURES = "mmap_features"
+MMAP_HISTORY = "mmap_history"
+MMAP_INFERENCE = "mmap_inference"
 MODE = "mode"
 MODEL_NAME = "model_name"
+NEGATIVE_SAMPLE_COUNT = "negative_sample_count"
 NETWORK = "network"
+NORM_MODE = "norm_mode"
 NORMALISATION_CONSTANT = "normalisation_constant"
+NUM_CLUSTERS = "num_clusters"
 NUMELEMENTS = "num_elements"
 NUM_EXP = "num_exp"
+NUM_HOPS = "num_hops"
+NUM_WORKERS = "num_workers"
+PAIR_LABELS = "pair_labels"
+PAIRS = "pairs"
 POLY_DEGREE = "poly_degree"
+POWER_ITERATION = "power_iteration"
+PREFETCH_SIZE = "prefetch_size"
 PUBMED = "pubmed"
+RANDOM_WALK = "random_walk"
+RESIDENT_DATA = "resident_data"
+RESIDENT_GRAPH = "resident_graph"
+SGC = "sgc"
 SPARSE_FEATURES = "sparse_features"
+SPLIT_SEEDS = "split_seeds"
 SUPPORTS = "supports"
 SUPPORT_SIZE = "support_size"
 SYMMETRIC = "symmetric"
@@ -1,4 +1,7 @@
+from collections.abc import Mapping
+
 import numpy as np
+from scipy import sparse as sp
 
 
 def invert_dict(_dict):
@@ -6,14 +9,6 @@ def invert_dict(_dict):
     return dict([[v, k] for k, v in _dict.items()])
 
 
-def map_set_to_khot_vector(index_set, num_classes):
-    '''Method to map a set to a k-hot vector of `num_classes`'''
-    khot_vector = np.zeros(num_classes, dtype=np.int32)
-    for index in index_set:
-        khot_vector[index] = 1
-    return khot_vector
-
-
 def map_list_to_floats(item_list):
     '''Method to map a list to list of floats'''
     return np.asarray(list(map(lambda x: float(x), item_list)))
@@ -22,4 +17,40 @@ def get_class_variables(class_variable):
     '''Method to return the class variables as a dict.
     Taken from: https://stackoverflow.com/questions/21322244/getting-a-dictionary-of-class-variables-and-values'''
     return {key:value for key, value in class_variable.__dict__.items()
-            if not key.startswith('__') and not callable(key)}
\ No newline at end of file
+            if not key.startswith('__') and not callable(key)}
+
+
+class SparseRowSetView(Mapping):
+    '''
+    Read-only dict like view which maps every row of a sparse 0/1 matrix to the set of its non-zero columns.
+    The sets are computed on access so the view costs no memory beyond the matrix itself.
+    If `transpose` is set, the view maps the columns to the set of their non-zero rows instead.
+    '''
+
+    def __init__(self, matrix, transpose=False):
+        self._matrix = matrix
+        self._transpose = transpose
+        self._csr = None
+
+    def _get_csr(self):
+        '''Method to build the CSR matrix backing the view on first access'''
+        if self._csr is None:
+            matrix = sp.csr_matrix(self._matrix)
+            if self._transpose:
+                matrix = matrix.transpose().tocsr()
+            self._csr = matrix
+        return self._csr
+
+    def __getitem__(self, key):
+        csr = self._get_csr()
+        if not (0 <= key < csr.shape[0]):
+            raise KeyError(key)
+        return set(csr.indices[csr.indptr[key]:csr.indptr[key + 1]].tolist())
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self):
+        if self._transpose:
+            return self._matrix.shape[1]
+        return self._matrix.shape[0]
@@ -23,7 +23,7 @@ flags = tf.app.flags
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string(DATASET_NAME, CITESEER, "Name of the dataset. Supported values are cora, pubmed, citeseer")
-flags.DEFINE_string(MODEL_NAME, GCN, "Name of the model. Supported values are ff, gcn, gcn_poly, gcn_ae, gcn_vae")
+flags.DEFINE_string(MODEL_NAME, GCN, "Name of the model. Supported values are ff, gcn, gcn_poly, sgc, gcn_ae, gcn_vae")
 flags.DEFINE_float(LEARNING_RATE, 0.01, "Initial learning rate")
 flags.DEFINE_integer(EPOCHS, 5, "Number of epochs to train for")
 flags.DEFINE_integer(HIDDEN_LAYER1_SIZE, 16, "Number of nodes in the first hidden layer")
@@ -36,8 +36,63 @@ flags.DEFINE_string(DATA_DIR, "/Users/shagun/projects/pregel/data", "Base direct
 flags.DEFINE_bool(SPARSE_FEATURES, True, "Boolean variable to indicate if the features are sparse or not")
 flags.DEFINE_bool(POLY_DEGREE, 1,
                   "Degree of the Chebyshev Polynomial. This value is used only if gcn_poly model is used.")
+flags.DEFINE_bool(LAZY_CHEBYSHEV, False,
+                  "Boolean variable to indicate if the Chebyshev polynomial should be applied to the hidden "
+                  "representation by the layers instead of being materialised as support matrices. This value is used "
+                  "only if gcn_poly model is used.")
+flags.DEFINE_integer(NUM_HOPS, 2, "Number of hops the features are propagated over the graph before the training. This "
+                                  "value is used only if sgc model is used.")
+flags.DEFINE_bool(CONCAT_HOPS, False, "Boolean variable to indicate if the propagated features for all the hops should "
+                                      "be concatenated (SIGN) instead of using only the last hop (SGC). This value is "
+                                      "used only if sgc model is used.")
+flags.DEFINE_string(NORM_MODE, SYMMETRIC, "Normalisation of the adjacency matrix. Supported values are symmetric "
+                                          "(D^-0.5.A.D^-0.5) and random_walk (D^-1.A)")
+flags.DEFINE_string(LAMBDA_MAX_MODE, ARPACK,
+                    "Method for estimating the largest eigenvalue of the laplacian for the gcn_poly model. Supported "
+                    "values are arpack, power_iteration (a few steps of power iteration) and analytic (the bound 2)")
+flags.DEFINE_string(EDGE_SPLIT_PATH, "", "Path of the .npz file with the train, validation and test edges for the auto "
+                                         "encoder models. The split is computed and saved there if the file does not "
+                                         "exist. With split_seeds, every seed uses its own file, named after the seed "
+                                         "(say split-1.npz for split.npz), instead of the cached splits")
+flags.DEFINE_string(SPLIT_SEEDS, "", "Comma separated list of seeds for the edge splits of the auto encoder models. "
+                                     "Run i uses the split for the i-th seed. If cache_dir is set and edge_split_path "
+                                     "is not, the splits for all the seeds are computed in parallel once and cached")
+flags.DEFINE_integer(NEGATIVE_SAMPLE_COUNT, 0, "Number of node pairs sampled as negatives per training step of the auto "
+                                              "encoder models. The training loss is then computed over the positive "
+                                              "edges and these samples only. If 0, the dense N X N loss is used")
+flags.DEFINE_integer(BATCH_SIZE, 0, "Number of seed nodes per mini-batch for the node classification models. If 0, "
+                                   "the models are trained on the full graph")
+flags.DEFINE_string(FANOUTS, "10", "Comma separated list of the number of neighbors sampled per node for every graph "
+                                   "convolution layer, starting from the first layer, in the mini-batch mode. A "
+                                   "single value is used for all the layers and 0 keeps all the neighbors")
+flags.DEFINE_integer(NUM_WORKERS, 2, "Number of background threads preparing the mini-batches")
+flags.DEFINE_integer(PREFETCH_SIZE, 4, "Number of mini-batches prepared ahead of the training step")
+flags.DEFINE_integer(NUM_CLUSTERS, 0, "Number of clusters the graph is partitioned into for the Cluster-GCN style "
+                                      "training. If set along with the batch_size, every training mini-batch is the "
+                                      "subgraph induced by clusters_per_batch random clusters. The evaluation still "
+                                      "uses mini-batches of batch_size nodes")
+flags.DEFINE_integer(CLUSTERS_PER_BATCH, 1, "Number of clusters combined into one training mini-batch")
+flags.DEFINE_bool(HISTORICAL_EMBEDDINGS, False, "Boolean variable to indicate if the gcn models should use the "
+                                                "historical embeddings in the mini-batch mode. The mini-batches then "
+                                                "cover all the nodes and the out of batch neighbors use their last "
+                                                "computed hidden activations instead of being sampled. The auto "
+                                                "encoder models always train on the full graph and do not use them")
+flags.DEFINE_bool(MMAP_HISTORY, False, "Boolean variable to indicate if the historical embeddings should be kept in "
+                                       "memory-mapped files in the cache_dir")
+flags.DEFINE_integer(INFERENCE_CHUNK_SIZE, 0, "Number of nodes per chunk for computing the node representations of "
+                                            "the node classification models layer by layer after the training. "
+                                            "If 0, they are computed by running the full graph in the full batch "
+                                            "mode and are not computed in the mini-batch mode")
+flags.DEFINE_bool(MMAP_INFERENCE, False, "Boolean variable to indicate if the layer by layer node representations "
+                                         "should be kept in memory-mapped files in the cache_dir")
 flags.DEFINE_string(TENSORBOARD_LOGS_DIR, "", "Directory for saving tensorboard logs")
 flags.DEFINE_integer(NUM_EXP, 1, "Number of times the experiment should be run before reporting the average performance")
+flags.DEFINE_string(CACHE_DIR, "", "Directory for caching the parsed graphs in a binary format. Caching is disabled "
+                                   "if this is not set")
+flags.DEFINE_bool(MMAP_FEATURES, False, "Boolean variable to indicate if the features should be converted to an "
+                                        "on-disk matrix in the cache_dir and memory-mapped")
+flags.DEFINE_bool(RESIDENT_GRAPH, False, "Boolean variable to indicate if the features, supports, labels and masks "
+                                         "should be loaded once into the session instead of being fed at every step")
 
 
 
@@ -49,7 +104,7 @@ ex.add_config(model_params.get_variables())
 
 @ex.automain
 def run():
-    if (model_params.model_name in [FF, GCN, GCN_POLY]):
+    if (model_params.model_name in [FF, GCN, GCN_POLY, SGC]):
         train_classifier.run(model_params=model_params,
                              data_dir=data_dir,
                              dataset_name=dataset_name,